@@ -1,18 +1,42 @@
+import time
+
+# Startup timing starts before the framework imports so they are part of the report
+_startup_begin = time.perf_counter()
+
 import os
 import logging
+import click
 from flask import Flask
+from flask_login import LoginManager
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-try:
-    from flask_login import LoginManager
-except ImportError:
-    print("flask_login not found, installing...")
-    import subprocess
-    subprocess.check_call(["pip", "install", "flask-login"])
-    from flask_login import LoginManager
+# Configure logging (LOG_LEVEL=DEBUG for verbose output)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Measures each startup phase and logs a one-line breakdown"""
+
+    def __init__(self, started):
+        self.started = started
+        self.mark = started
+        self.phases = []
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+    def phase(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.mark) * 1000))
+        self.mark = now
+
+    def report(self):
+        total = (self.mark - self.started) * 1000
+        logger.info("Startup finished in %.0f ms (%s)", total,
+                    ', '.join(f"{name} {elapsed:.0f} ms" for name, elapsed in self.phases))
+        return dict(self.phases, total=total)
+
+
+startup = StartupTimer(_startup_begin)
+startup.phase('framework imports')
 
 # Create the app
 app = Flask(__name__)
@@ -27,35 +51,113 @@ login_manager.login_message = 'Por favor, faça login para acessar esta página.
 
 # Import models and routes after app creation to avoid circular imports
 from models import User, Client, KanbanCard, WhatsAppMessage, SocialAccount, SocialPost
+from database import init_database, create_schema, schema_ready
+startup.phase('models and SQLAlchemy')
+from services.whatsapp_queue import outbound_queue
+from services.campaigns import campaign_runner
+from services.post_scheduler import post_scheduler
+from services.report_jobs import report_jobs
 from routes import *
+startup.phase('services and routes')
+
+# Use the relational backend when DATABASE_URL is set (SQLite locally, PostgreSQL in production)
+using_database = init_database(app)
+startup.phase('database')
+
+# Only remember the app here; the services start in start_background_services()
+outbound_queue.init_app(app)
+campaign_runner.init_app(app)
+post_scheduler.init_app(app)
+report_jobs.init_app(app)
+
+
+def start_background_services():
+    """Resume pending work and start the background threads of this serving process.
+
+    Called once per process that serves requests: gunicorn's post_worker_init hook
+    (gunicorn.conf.py) or `python main.py`. Never at import, so the CLI commands
+    (init-db runs on every deploy) and anything else importing the app do not claim
+    messages, advance campaigns or clean up reports/ and then exit with the work.
+    """
+    started = time.perf_counter()
+    if using_database and not schema_ready(app):
+        # Tables are created once with `flask --app main init-db`, not by every worker
+        logger.warning("Database tables are missing: run `flask --app main init-db`")
+        return
+    # Resume WhatsApp messages left in the outbound queue and running campaigns
+    outbound_queue.resume_pending()
+    campaign_runner.resume_pending()
+    # Resume queued report jobs and clean up expired files in reports/
+    report_jobs.resume_pending()
+    # Every worker competes for the publisher's leader lease; only the holder publishes
+    post_scheduler.start()
+    logger.info("Background services started in %.0f ms", (time.perf_counter() - started) * 1000)
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.get(int(user_id))
 
+# Sample users (credentials shown on the login page). The hashes are the
+# default Werkzeug scrypt hashes of admin123 and vendedor123, precomputed so
+# seeding does not run the deliberately slow KDF on every boot.
+SAMPLE_USERS = [
+    {
+        'username': 'admin',
+        'email': 'admin@monteirocorretora.com',
+        'name': 'Administrador',
+        'role': 'admin',
+        'password_hash': 'scrypt:32768:8:1$9ywFtxoU6jAs6HJD$12790d7cf078eeb9c42c2f781b89b39a7a42957065b3cfedfd4ef4f16269abc2d38850c3ec8ab2d7c8e8362a4742e72e5abd9333b16866cf8da3a78281931f68',
+    },
+    {
+        'username': 'vendedor1',
+        'email': 'vendedor@monteirocorretora.com',
+        'name': 'João Vendedor',
+        'role': 'sales',
+        'password_hash': 'scrypt:32768:8:1$Cm3XpMgRKCHxPK7b$6546b7defbc194e6a0247fc3d489951483c5f7f3c955b47d1c453a088b3f13642938f5323d5380e990382448d45de8a65214da037771c209add89c017edcf7fc',
+    },
+]
+
 # Initialize sample data
 def init_sample_data():
-    # Create admin user if not exists
-    if not User.get_by_username('admin'):
-        admin = User(
-            username='admin',
-            email='admin@monteirocorretora.com',
-            name='Administrador',
-            role='admin'
+    """Create the sample users that do not exist yet; returns how many were created"""
+    created = 0
+    for sample in SAMPLE_USERS:
+        if User.get_by_username(sample['username']):
+            continue
+        user = User(
+            username=sample['username'],
+            email=sample['email'],
+            name=sample['name'],
+            role=sample['role']
         )
-        admin.set_password('admin123')
-        User.save(admin)
-    
-    # Create sample sales user
-    if not User.get_by_username('vendedor1'):
-        sales_user = User(
-            username='vendedor1',
-            email='vendedor@monteirocorretora.com',
-            name='João Vendedor',
-            role='sales'
-        )
-        sales_user.set_password('vendedor123')
-        User.save(sales_user)
+        user.password_hash = sample['password_hash']
+        User.save(user)
+        created += 1
+    return created
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the missing database tables and indexes (run on deploy: flask --app main init-db)"""
+    if not using_database:
+        click.echo('DATABASE_URL is not set: the in-memory store needs no schema.')
+        return
+    create_schema(app)
+    click.echo('Database tables are ready.')
+
+@app.cli.command('seed')
+def seed_command():
+    """Create the sample users in the database (run once: flask --app main seed)"""
+    if not using_database:
+        click.echo('DATABASE_URL is not set: the in-memory store is seeded on every startup.')
+        return
+    created = init_sample_data()
+    click.echo(f'{created} sample user(s) created.')
+
+if not using_database:
+    # The in-memory store starts empty in every process, so it is seeded here;
+    # with a database, seeding is the explicit `seed` command above
+    with app.app_context():
+        init_sample_data()
+    startup.phase('seed')
 
-# Initialize data on startup
-init_sample_data()
+startup_timings = startup.report()
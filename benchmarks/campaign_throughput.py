@@ -0,0 +1,94 @@
+"""Vazão de uma campanha WhatsApp contra um stub local do endpoint de mensagens.
+
+Uso (na raiz do projeto): python -m benchmarks.campaign_throughput [destinatários] [latência ms]
+
+Sobe um servidor HTTP local que responde ao POST /<phone_id>/messages depois
+de ``latência`` ms e mede quanto tempo a campanha leva do início até todas as
+mensagens ficarem ``sent``: primeiro no ritmo padrão (``CAMPAIGN_RATE``),
+depois sem o limite da campanha, quando a vazão passa a depender dos
+``WHATSAPP_SEND_WORKERS`` em paralelo. Os limites da Graph API e do tier são
+levantados: o benchmark mede a campanha e a fila, não o agendador.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('META_RATE_APP', '100000')
+os.environ.setdefault('META_BURST_APP', '100000')
+os.environ.setdefault('META_RATE_PHONE', '100000')
+os.environ.setdefault('META_BURST_PHONE', '100000')
+
+from models import Client, Campaign, WhatsAppMessage
+from services.campaigns import CAMPAIGN_RATE, CampaignRunner, TierWindow
+from services.graph_scheduler import TokenBucket
+from services.whatsapp_queue import SEND_WORKERS
+
+RECIPIENTS = 1_000
+LATENCY_MS = 50
+UNTHROTTLED = 100_000
+
+
+class MessagesStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = LATENCY_MS / 1000
+    sent = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        with self.lock:
+            MessagesStub.sent += 1
+            body = json.dumps({'messages': [{'id': f"wamid.{MessagesStub.sent}"}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def populate(recipients):
+    for i in range(recipients):
+        Client.save(Client(f"Cliente {i}", f"cliente{i}@exemplo.com.br", f"(11) 9{i:08d}", '', insurance_type='auto'))
+
+
+def run_campaign(rate, recipients):
+    """Tempo (s) até todas as mensagens de uma campanha nova estarem enviadas"""
+    runner = CampaignRunner()
+    runner.bucket = TokenBucket(rate, max(1, int(rate)))
+    runner.tier = TierWindow(limit=recipients * 10)
+    campaign = Campaign(f"Benchmark {rate:g}/s", 'Olá {primeiro_nome}, sua apólice vence em breve.',
+                        insurance_type='auto')
+    start = time.perf_counter()
+    runner.start(campaign)
+    while WhatsAppMessage.count_by_campaign(campaign.id).get('sent', 0) < recipients:
+        time.sleep(0.05)
+    return time.perf_counter() - start
+
+
+def main(recipients, latency_ms):
+    MessagesStub.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MessagesStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # A instância compartilhada da API é criada no primeiro envio e lê a URL daqui
+    os.environ['META_API_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}/v18.0"
+    populate(recipients)
+    print(f"{recipients} destinatários, stub com {latency_ms} ms, {SEND_WORKERS} workers de envio")
+    try:
+        for label, rate in ((f"ritmo padrão ({CAMPAIGN_RATE:g} msg/s)", CAMPAIGN_RATE), ('sem limite', UNTHROTTLED)):
+            elapsed = run_campaign(rate, recipients)
+            print(f"{label:<26} {elapsed:6.1f} s  ({recipients / elapsed * 60:,.0f} msg/min)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else RECIPIENTS,
+         float(sys.argv[2]) if len(sys.argv) > 2 else LATENCY_MS)
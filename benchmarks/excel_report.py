@@ -0,0 +1,45 @@
+"""Tempo e memória do relatório de clientes em Excel com 100k linhas.
+
+Uso (na raiz do projeto): python -m benchmarks.excel_report [linhas]
+
+Gera a planilha em memória, como a rota /reports/export/clients?type=excel.
+O pico de memória é o aumento do RSS máximo do processo durante a geração
+(os clientes são criados antes), então rode uma medição por processo. Com
+as planilhas write-only do openpyxl o pico acompanha o arquivo gerado, não
+o número de células.
+"""
+import resource
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+from types import SimpleNamespace
+from services.report_generator import ReportGenerator
+
+ROWS = 100_000
+
+
+def make_clients(rows):
+    return [SimpleNamespace(id=i, name=f"Cliente Exemplo {i}", email=f"cliente{i}@exemplo.com.br",
+                            phone='(11) 99999-0000', cpf_cnpj='123.456.789-00', insurance_type='auto',
+                            address=f"Rua das Flores, {i}", created_at=datetime(2024, 1, 1), status='ativo')
+            for i in range(rows)]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB no Linux
+
+
+def main(rows):
+    clients = make_clients(rows)
+    base = peak_rss_mb()
+    output = BytesIO()
+    start = time.perf_counter()
+    ReportGenerator().write_client_report_excel(clients, output)
+    elapsed = time.perf_counter() - start
+    print(f"{rows} linhas: {elapsed:.1f} s, pico de memória +{peak_rss_mb() - base:.0f} MB, "
+          f"arquivo {len(output.getvalue()) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
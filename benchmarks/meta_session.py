@@ -0,0 +1,68 @@
+"""Latência por chamada à Graph API: conexão nova a cada chamada x sessão compartilhada.
+
+Uso (na raiz do projeto): python -m benchmarks.meta_session [chamadas]
+
+Sobe um servidor HTTP/1.1 local que imita a Graph API e compara o
+``requests.get`` avulso (uma conexão TCP por chamada, como antes) com o
+``MetaBusinessAPI`` usando a sessão com keep-alive do processo. O servidor é
+HTTP puro, então só o handshake TCP é economizado; contra graph.facebook.com
+o handshake TLS também deixa de acontecer a cada chamada.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Sem o limite de taxa do app: o benchmark mede a conexão, não o agendador
+os.environ.setdefault('META_RATE_APP', '100000')
+os.environ.setdefault('META_BURST_APP', '100000')
+
+import requests
+from services.meta_api import MetaBusinessAPI, get_session
+
+CALLS = 500
+BODY = json.dumps({'data': [{'id': '1', 'name': 'Página', 'access_token': 'token'}]}).encode()
+
+
+class GraphStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def per_call(fn, calls):
+    fn()  # aquecimento
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main(calls):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GraphStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v18.0"
+    url = f"{base_url}/me/accounts"
+    try:
+        fresh = per_call(lambda: requests.get(url, timeout=5).json(), calls)
+        api = MetaBusinessAPI(base_url=base_url, session=get_session())
+        pooled = per_call(lambda: api._get(url).json(), calls)
+    finally:
+        server.shutdown()
+    print(f"conexão nova por chamada: {fresh:.2f} ms/chamada")
+    print(f"sessão compartilhada:     {pooled:.2f} ms/chamada ({fresh - pooled:.2f} ms economizados)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CALLS)
@@ -0,0 +1,35 @@
+"""Tempo e memória do relatório de clientes em PDF com 50k clientes.
+
+Uso (na raiz do projeto): python -m benchmarks.pdf_report [clientes]
+
+A tabela é montada em blocos de ``CLIENT_TABLE_CHUNK_ROWS`` linhas com
+larguras e alturas fixas, e cada bloco só vira ``Table`` quando o reportlab
+chega nele. Por isso o tempo cresce de forma linear com o número de clientes
+e o pico de memória não acompanha o tamanho da tabela. Como no benchmark do
+Excel, o pico é o aumento do RSS máximo durante a geração.
+"""
+import os
+import sys
+import time
+from benchmarks.excel_report import make_clients, peak_rss_mb
+from services.report_generator import ReportGenerator
+
+CLIENTS = 50_000
+
+
+def main(count):
+    clients = make_clients(count)
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    filepath = ReportGenerator().generate_client_report_pdf(clients, f"benchmark_clientes_{os.getpid()}.pdf")
+    elapsed = time.perf_counter() - start
+    try:
+        size = os.path.getsize(filepath)
+    finally:
+        os.remove(filepath)
+    print(f"{count} clientes: {elapsed:.1f} s, pico de memória +{peak_rss_mb() - base:.0f} MB, "
+          f"arquivo {size / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS)
@@ -0,0 +1,69 @@
+"""Tempo do pacote ZIP com todos os relatórios: sequencial x processos em paralelo.
+
+Uso (na raiz do projeto): python -m benchmarks.report_bundle [clientes] [cartões]
+
+Mede a geração dos cinco relatórios um após o outro, o ``build_bundle`` com
+um processo e com ``BUNDLE_WORKERS`` (um por núcleo) e o pacote com tudo já
+em cache. O cache usa um diretório temporário, então ``reports/cache`` não é
+tocado. O ganho do paralelo depende do número de núcleos.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from io import BytesIO
+from models import Client, KanbanCard
+from services.report_cache import report_cache
+from services.report_generator import ReportGenerator
+from services.report_jobs import REPORT_FORMATS, BUNDLE_WORKERS, build_bundle, generate_report, load_report_data
+
+CLIENTS = 20_000
+CARDS = 5_000
+
+
+def populate(clients, cards):
+    Client.store.save_many([Client(f"Cliente {i}", f"cliente{i}@exemplo.com.br", '(11) 99999-0000', f"{i:011d}",
+                                   address=f"Rua das Flores, {i}", insurance_type='auto') for i in range(clients)])
+    for i in range(cards):
+        KanbanCard.store.save(KanbanCard(f"Cartão {i}", f"Descrição {i}", None, 1,
+                                         column=KanbanCard.COLUMNS[i % len(KanbanCard.COLUMNS)]))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def sequential():
+    data = {report_type: load_report_data(report_type) for report_type in REPORT_FORMATS}
+    paths = [generate_report(report_type, file_format, data[report_type])
+             for report_type, formats in REPORT_FORMATS.items() for file_format in formats]
+    for path in paths:
+        os.remove(path)
+
+
+def main(clients, cards):
+    populate(clients, cards)
+    ReportGenerator()  # carregar reportlab/openpyxl e os estilos antes da primeira medição
+    report_cache.directory = tempfile.mkdtemp(prefix='report-bundle-')
+    try:
+        elapsed, _ = timed(sequential)
+        print(f"{clients} clientes, {cards} cartões, {os.cpu_count()} núcleo(s)")
+        print(f"sequencial:                   {elapsed:6.1f} s")
+        for workers in sorted({1, BUNDLE_WORKERS}):
+            shutil.rmtree(report_cache.directory)
+            elapsed, output = timed(lambda: build_bundle(BytesIO(), workers=workers))
+            files = len(zipfile.ZipFile(output).namelist())
+            print(f"build_bundle, {workers} processo(s):  {elapsed:6.1f} s ({files} arquivos)")
+        elapsed, _ = timed(lambda: build_bundle(BytesIO()))
+        print(f"build_bundle, tudo em cache:  {elapsed:6.1f} s")
+    finally:
+        shutil.rmtree(report_cache.directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    # A guarda é obrigatória: os processos do pacote (forkserver/spawn) importam o módulo principal
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS, int(sys.argv[2]) if len(sys.argv) > 2 else CARDS)
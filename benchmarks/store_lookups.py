@@ -0,0 +1,51 @@
+"""Latência das consultas indexadas do MemoryStore de 1k a 1M registros.
+
+Uso (na raiz do projeto): python -m benchmarks.store_lookups [tamanhos...]
+
+Os stores crescem até cada tamanho e as consultas são medidas com resultado
+de tamanho fixo; com os índices a latência fica estável enquanto a tabela cresce.
+"""
+import sys
+import time
+from models import User, KanbanCard, WhatsAppMessage
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+LOOKUPS = 2_000
+MESSAGES_PER_CLIENT = 10
+
+
+def grow(size, start):
+    for i in range(start, size):
+        user = User(f"usuario{i}", f"usuario{i}@exemplo.com.br", f"Usuário {i}")
+        User.store.save(user)
+        card = KanbanCard(f"Cartão {i}", '', i, 1, column=KanbanCard.COLUMNS[i % len(KanbanCard.COLUMNS)])
+        KanbanCard.store.save(card)
+        message = WhatsAppMessage(f"Cliente {i}", 'Olá', client_id=i // MESSAGES_PER_CLIENT)
+        WhatsAppMessage.store.save(message)
+
+
+def per_call(fn, keys):
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main(sizes):
+    print(f"{'registros':>10} {'get_by_username':>16} {'get_by_column':>14} {'get_by_client':>14}  (µs/consulta)")
+    grown = 0
+    for size in sizes:
+        grow(size, grown)
+        grown = size
+        step = max(size // LOOKUPS, 1)
+        usernames = [f"usuario{i}" for i in range(0, size, step)]
+        columns = [KanbanCard.COLUMNS[i % len(KanbanCard.COLUMNS)] for i in range(LOOKUPS)]
+        clients = [i // MESSAGES_PER_CLIENT for i in range(0, size, step)]
+        print(f"{size:>10} "
+              f"{per_call(User.get_by_username, usernames):>16.2f} "
+              f"{per_call(lambda column: KanbanCard.get_by_column(column, limit=20), columns):>14.2f} "
+              f"{per_call(WhatsAppMessage.get_by_client, clients):>14.2f}")
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,54 @@
+"""Consultas quentes do log de mensagens WhatsApp com até 1M mensagens.
+
+Uso (na raiz do projeto): python -m benchmarks.whatsapp_messages [tamanhos...]
+
+Nove de cada dez mensagens são enviadas (``read`` continua False para sempre)
+e as recebidas são quase todas lidas; restam 50 não lidas por etapa. "Últimas
+N", "conversa do cliente desde T" e "não lidas" devem custar o tamanho do
+resultado, não o do histórico.
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from models import WhatsAppMessage
+
+SIZES = (10_000, 100_000, 1_000_000)
+CLIENTS = 1_000
+UNREAD_PER_STEP = 50
+REPEAT = 200
+START = datetime(2024, 1, 1)
+
+
+def grow(size, start):
+    unread_from = size - UNREAD_PER_STEP * 10
+    for i in range(start, size):
+        received = i % 10 == 0
+        message = WhatsAppMessage(f"Cliente {i % CLIENTS}", 'Olá', message_type='received' if received else 'sent',
+                                  client_id=i % CLIENTS)
+        message.timestamp = START + timedelta(seconds=i)
+        message.read = received and i < unread_from
+        WhatsAppMessage.store.save(message)
+
+
+def per_call(fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn()
+    return (time.perf_counter() - start) / REPEAT * 1e6, len(result)
+
+
+def main(sizes):
+    print(f"{'mensagens':>10} {'últimas 20':>12} {'cliente desde T':>16} {'não lidas':>16}  (µs/consulta, itens)")
+    grown = 0
+    for size in sizes:
+        grow(size, grown)
+        grown = size
+        since = START + timedelta(seconds=size - 20 * CLIENTS)
+        latest, _ = per_call(lambda: WhatsAppMessage.get_latest(20))
+        thread, thread_items = per_call(lambda: WhatsAppMessage.get_by_client(7, since=since))
+        unread, unread_items = per_call(WhatsAppMessage.get_unread)
+        print(f"{size:>10} {latest:>12.1f} {thread:>11.1f} ({thread_items:>2}) {unread:>10.1f} ({unread_items:>3})")
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or SIZES)
@@ -0,0 +1,418 @@
+import os
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import (Table, Column, Integer, String, Text, Boolean, DateTime, JSON, DDL,
+                        Index, select, func, or_, and_, case, event, inspect)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import registry
+from models import (User, Client, KanbanCard, WhatsAppMessage, SocialAccount, SocialPost, Campaign, SyncState,
+                    ReportJob, Lease, dashboard_metrics, search_terms)
+
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+users_table = Table(
+    'users', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(80), nullable=False),
+    Column('email', String(120), nullable=False),
+    Column('name', String(120), nullable=False),
+    Column('role', String(20), nullable=False, default='atendimento'),
+    Column('password_hash', String(256)),
+    Column('created_at', DateTime, nullable=False),
+    Column('active', Boolean, nullable=False, default=True),
+    Index('ix_users_username', 'username', unique=True),
+)
+
+clients_table = Table(
+    'clients', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('email', String(120), nullable=False),
+    Column('phone', String(30), nullable=False),
+    Column('cpf_cnpj', String(20), nullable=False),
+    Column('address', Text, default=''),
+    Column('insurance_type', String(50), default=''),
+    Column('notes', Text, default=''),
+    Column('created_at', DateTime, nullable=False),
+    Column('updated_at', DateTime, nullable=False),
+    Column('status', String(20), nullable=False, default='ativo'),
+    Column('phone_normalized', String(30)),
+    Column('search_text', Text),  # nome e email sem acentos, em minúsculas
+    Column('search_digits', String(60)),  # dígitos do telefone e do CPF/CNPJ
+    Index('ix_clients_cpf_cnpj', 'cpf_cnpj'),
+    Index('ix_clients_phone_normalized', 'phone_normalized'),
+    Index('ix_clients_insurance_type_status', 'insurance_type', 'status'),
+    # Índices de trigramas (pg_trgm) para LIKE '%termo%' no PostgreSQL
+    Index('ix_clients_search_text_trgm', 'search_text', postgresql_using='gin',
+          postgresql_ops={'search_text': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+    Index('ix_clients_search_digits_trgm', 'search_digits', postgresql_using='gin',
+          postgresql_ops={'search_digits': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+)
+event.listen(clients_table, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+kanban_cards_table = Table(
+    'kanban_cards', db.metadata,
+    Column('id', String(36), primary_key=True),
+    Column('title', String(200), nullable=False),
+    Column('description', Text, default=''),
+    Column('client_id', Integer),
+    Column('assigned_to', Integer),
+    Column('column', String(30), nullable=False),
+    Column('priority', String(10), nullable=False, default='medium'),
+    Column('created_at', DateTime, nullable=False),
+    Column('updated_at', DateTime, nullable=False),
+    Column('due_date', DateTime),
+    Index('ix_kanban_cards_column_updated_at', 'column', 'updated_at'),
+    Index('ix_kanban_cards_client_id', 'client_id'),
+)
+
+whatsapp_messages_table = Table(
+    'whatsapp_messages', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('sender', String(120), nullable=False),
+    Column('message', Text, nullable=False),
+    Column('message_type', String(10), nullable=False, default='received'),
+    Column('client_id', Integer),
+    Column('timestamp', DateTime, nullable=False),
+    Column('read', Boolean, nullable=False, default=False),
+    Column('recipient', String(30)),
+    Column('status', String(10)),
+    Column('external_id', String(128)),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('error', Text),
+    Column('campaign_id', Integer),
+    Column('claimed_at', DateTime),
+    Index('ix_whatsapp_messages_timestamp', 'timestamp'),
+    Index('ix_whatsapp_messages_status', 'status'),
+    Index('ix_whatsapp_messages_external_id', 'external_id', unique=True),
+    Index('ix_whatsapp_messages_unread', 'read', 'message_type'),
+    Index('ix_whatsapp_messages_client_id_timestamp', 'client_id', 'timestamp'),
+    Index('ix_whatsapp_messages_campaign_id_status', 'campaign_id', 'status'),
+)
+
+social_accounts_table = Table(
+    'social_accounts', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('platform', String(20), nullable=False),
+    Column('account_id', String(64), nullable=False),
+    Column('name', String(200), nullable=False),
+    Column('access_token', Text),
+    Column('connected', Boolean, nullable=False, default=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('last_sync', DateTime),
+    Index('ix_social_accounts_platform', 'platform'),
+)
+
+social_posts_table = Table(
+    'social_posts', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('account_id', String(64), nullable=False),
+    Column('content', Text, nullable=False),
+    Column('platform', String(20), nullable=False),
+    Column('post_type', String(10), nullable=False, default='text'),
+    Column('media_url', Text),
+    Column('scheduled_time', DateTime),
+    Column('published', Boolean, nullable=False, default=False),
+    Column('published_at', DateTime),
+    Column('created_at', DateTime, nullable=False),
+    Column('metrics', JSON),
+    Index('ix_social_posts_platform', 'platform'),
+    Index('ix_social_posts_published_scheduled_time', 'published', 'scheduled_time'),
+)
+
+campaigns_table = Table(
+    'campaigns', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('template', Text, nullable=False),
+    Column('insurance_type', String(50), default=''),
+    Column('client_status', String(20), default=''),
+    Column('created_from', DateTime),
+    Column('created_to', DateTime),
+    Column('created_by', Integer),
+    Column('status', String(20), nullable=False, default='running'),
+    Column('total', Integer, nullable=False, default=0),
+    Column('last_client_id', Integer, nullable=False, default=0),
+    Column('created_at', DateTime, nullable=False),
+    Column('finished_at', DateTime),
+    Index('ix_campaigns_status', 'status'),
+)
+
+sync_states_table = Table(
+    'sync_states', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('key', String(120), nullable=False),
+    Column('watermark', DateTime),
+    Column('seen_ids', JSON),
+    Column('updated_at', DateTime, nullable=False),
+    Index('ix_sync_states_key', 'key', unique=True),
+)
+
+report_jobs_table = Table(
+    'report_jobs', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('report_type', String(20), nullable=False),
+    Column('file_format', String(10), nullable=False),
+    Column('requested_by', Integer),
+    Column('status', String(20), nullable=False, default='queued'),
+    Column('progress', Integer, nullable=False, default=0),
+    Column('filepath', String(255)),
+    Column('error', Text),
+    Column('created_at', DateTime, nullable=False),
+    Column('heartbeat_at', DateTime),
+    Column('finished_at', DateTime),
+    Index('ix_report_jobs_status', 'status'),
+)
+
+leases_table = Table(
+    'leases', db.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('key', String(60), nullable=False),
+    Column('holder', String(120)),
+    Column('expires_at', DateTime),
+    Index('ix_leases_key', 'key', unique=True),
+)
+
+MAPPINGS = (
+    (User, users_table),
+    (Client, clients_table),
+    (KanbanCard, kanban_cards_table),
+    (WhatsAppMessage, whatsapp_messages_table),
+    (SocialAccount, social_accounts_table),
+    (SocialPost, social_posts_table),
+    (Campaign, campaigns_table),
+    (SyncState, sync_states_table),
+    (ReportJob, report_jobs_table),
+    (Lease, leases_table),
+)
+
+# Ordenação dentro dos grupos lidos por ``SQLStore.group`` (espelha ``grouped`` do MemoryStore)
+GROUP_ORDERING = {
+    KanbanCard: {'column': 'updated_at'},
+    WhatsAppMessage: {'client_id': 'timestamp'},
+}
+
+# INSERT com ON CONFLICT por dialeto, usado por ``SQLStore.save_many(unique_by=...)``
+INSERT_CONSTRUCTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert,
+}
+
+# Colunas normalizadas (texto sem acentos, dígitos) lidas por ``SQLStore.search``
+SEARCH_COLUMNS = {
+    Client: ('search_text', 'search_digits'),
+}
+
+
+class SQLStore:
+    """Armazenamento relacional com a mesma interface do ``MemoryStore``"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __len__(self):
+        return self.count()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        return db.session.get(self.model, key)
+
+    def all(self, order_by=None, reverse=False):
+        stmt = select(self.model)
+        if order_by:
+            column = getattr(self.model, order_by)
+            stmt = stmt.order_by(column.desc() if reverse else column)
+        return list(db.session.scalars(stmt))
+
+    def filter(self, **criteria):
+        return list(db.session.scalars(select(self.model).filter_by(**criteria)))
+
+    def first(self, **criteria):
+        return db.session.scalars(select(self.model).filter_by(**criteria).limit(1)).first()
+
+    def count(self, **criteria):
+        stmt = select(func.count()).select_from(self.model)
+        if criteria:
+            stmt = stmt.filter_by(**criteria)
+        return db.session.scalar(stmt)
+
+    def page(self, order_by, limit, after=None, reverse=False):
+        column = getattr(self.model, order_by)
+        key = self.model.id
+        stmt = select(self.model)
+        if after:
+            value, last_key = after
+            if reverse:
+                stmt = stmt.where(or_(column < value, and_(column == value, key < last_key)))
+            else:
+                stmt = stmt.where(or_(column > value, and_(column == value, key > last_key)))
+        if reverse:
+            stmt = stmt.order_by(column.desc(), key.desc())
+        else:
+            stmt = stmt.order_by(column, key)
+        items = list(db.session.scalars(stmt.limit(limit + 1)))
+        if len(items) > limit:
+            items = items[:limit]
+            return items, (getattr(items[-1], order_by), items[-1].id)
+        return items, None
+
+    def group(self, field, value, limit=None, reverse=False, since=None):
+        order_by = getattr(self.model, GROUP_ORDERING[self.model][field])
+        stmt = select(self.model).filter_by(**{field: value})
+        if since is not None:
+            stmt = stmt.where(order_by >= since)
+        stmt = stmt.order_by(order_by.desc() if reverse else order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return list(db.session.scalars(stmt))
+
+    def count_since(self, order_by, since, present=None):
+        stmt = select(func.count()).select_from(self.model).where(getattr(self.model, order_by) >= since)
+        if present is not None:
+            stmt = stmt.where(getattr(self.model, present).is_not(None))
+        return db.session.scalar(stmt)
+
+    def counts_by(self, field):
+        column = getattr(self.model, field)
+        return dict(db.session.execute(select(column, func.count()).group_by(column)).all())
+
+    def search(self, query, fields, limit=None):
+        """Busca com a mesma semântica do ``TextIndex``: todos os termos precisam
+        casar, sem diferenciar acentos, e o início do campo ou de uma palavra vem antes"""
+        if self.model not in SEARCH_COLUMNS:
+            pattern = f"%{query}%"
+            stmt = select(self.model).where(or_(*[getattr(self.model, field).ilike(pattern) for field in fields]))
+            stmt = stmt.order_by(getattr(self.model, fields[0]))
+        else:
+            terms = search_terms(query)
+            if not terms:
+                return []
+            text_column, digits_column = (getattr(self.model, column) for column in SEARCH_COLUMNS[self.model])
+            conditions = []
+            for text, digits in terms:
+                condition = text_column.contains(text, autoescape=True)
+                if digits:
+                    condition = or_(condition, digits_column.contains(digits, autoescape=True))
+                conditions.append(condition)
+            first = terms[0][0]
+            rank = case((text_column.startswith(first, autoescape=True), 0),
+                        (text_column.contains(' ' + first, autoescape=True), 1),
+                        else_=2)
+            stmt = select(self.model).where(and_(*conditions)).order_by(rank, getattr(self.model, fields[0]))
+        if limit:
+            stmt = stmt.limit(limit)
+        return list(db.session.scalars(stmt))
+
+    def save(self, obj):
+        db.session.add(obj)
+        db.session.commit()
+        return obj
+
+    def save_many(self, objs, unique_by=None):
+        if not unique_by:
+            db.session.add_all(objs)
+            db.session.commit()
+            return objs
+        # INSERT ... ON CONFLICT DO NOTHING sobre o índice único de ``unique_by``: o
+        # banco descarta as duplicatas mesmo com vários workers gravando ao mesmo tempo
+        if not objs:
+            return []
+        table = inspect(self.model).local_table
+        insert = INSERT_CONSTRUCTS[db.session.get_bind().dialect.name]
+        rows = [{column.key: getattr(obj, column.key) for column in table.columns if column.key != 'id'}
+                for obj in objs]
+        stmt = insert(table).on_conflict_do_nothing(index_elements=[unique_by])
+        inserted = dict((value, key) for key, value in
+                        db.session.execute(stmt.returning(table.c.id, table.c[unique_by]), rows))
+        db.session.commit()
+        saved = []
+        for obj in objs:
+            if getattr(obj, unique_by) in inserted:
+                obj.id = inserted.pop(getattr(obj, unique_by))
+                saved.append(obj)
+        return saved
+
+    def existing(self, field, values):
+        column = getattr(self.model, field)
+        return set(db.session.scalars(select(column).where(column.in_(list(values)))))
+
+    def update(self, key, expect=None, **changes):
+        obj = db.session.get(self.model, key, with_for_update=True, populate_existing=True)
+        if obj is None or (expect and any(getattr(obj, field) != value for field, value in expect.items())):
+            db.session.rollback()
+            return None
+        previous = {field: getattr(obj, field) for field in changes}
+        for field, value in changes.items():
+            setattr(obj, field, value)
+        db.session.commit()
+        return previous
+
+    def delete(self, key):
+        obj = self.get(key)
+        if obj is None:
+            return False
+        db.session.delete(obj)
+        db.session.commit()
+        return True
+
+
+def get_database_url():
+    """Ler a URL do banco, normalizando o esquema legado ``postgres://``"""
+    url = os.environ.get('DATABASE_URL')
+    if url and url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def get_engine_options(url):
+    """Opções do pool de conexões; SQLite usa o pool padrão do SQLAlchemy"""
+    options = {'pool_pre_ping': True}
+    if not url.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 300)),
+        })
+    return options
+
+
+def init_database(app):
+    """Ativar o backend SQLAlchemy se DATABASE_URL estiver definido.
+
+    Retorna True quando os modelos passaram a usar o banco e False quando a
+    aplicação continua no armazenamento em memória. Não cria tabelas: isso é
+    feito uma vez com ``create_schema`` (comando ``init-db``), não a cada
+    worker que sobe.
+    """
+    url = get_database_url()
+    if not url:
+        return False
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = get_engine_options(url)
+    db.init_app(app)
+
+    mapper_registry = registry(metadata=db.metadata)
+    for model, table in MAPPINGS:
+        mapper_registry.map_imperatively(model, table)
+        model.store = SQLStore(model)
+    # Os contadores em memória não enxergam escritas de outros workers
+    dashboard_metrics.incremental = False
+    return True
+
+
+def create_schema(app):
+    """Criar as tabelas e índices que faltam (flask --app main init-db); não altera os existentes"""
+    with app.app_context():
+        db.create_all()
+
+
+def schema_ready(app):
+    """Todas as tabelas dos modelos já existem no banco?"""
+    with app.app_context():
+        existing = set(inspect(db.engine).get_table_names())
+    return set(db.metadata.tables) <= existing
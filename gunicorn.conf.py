@@ -0,0 +1,7 @@
+# Read by gunicorn from the working directory (deployment and the "Start application" workflow)
+
+
+def post_worker_init(worker):
+    """Start the background services in each worker once it has loaded the app"""
+    from app import start_background_services
+    start_background_services()
@@ -1,4 +1,12 @@
-from app import app
+import os
+
+# Report bundle processes (forkserver/spawn) import this file as __mp_main__ when
+# the app is started with `python main.py`; they must not boot the app again
+if __name__ != '__mp_main__':
+    from app import app, start_background_services
 
 if __name__ == '__main__':
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(host='0.0.0.0', port=5000, debug=True)
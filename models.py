@@ -1,20 +1,581 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+import base64
+import heapq
+import json
+import threading
+import unicodedata
 import uuid
 
-# In-memory storage for MVP
-users_db = {}
-clients_db = {}
-kanban_cards_db = {}
-whatsapp_messages_db = {}
-social_accounts_db = {}
-social_posts_db = {}
+
+def fold_text(value):
+    """Normalizar texto para busca: minúsculas, sem acentos e espaços colapsados"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.lower().split())
+
+
+def only_digits(value):
+    return ''.join(ch for ch in (value or '') if ch.isdigit())
+
+
+def normalize_phone(value):
+    """Telefone só com dígitos e sem o código do Brasil (55), para casar
+    "(11) 99999-9999" com o "5511999999999" enviado pelo WhatsApp"""
+    digits = only_digits(value)
+    if digits.startswith('55') and len(digits) in (12, 13):
+        digits = digits[2:]
+    return digits
+
+
+def search_terms(query):
+    """Separar a busca em termos (texto normalizado, dígitos) que precisam casar todos.
+
+    Buscas sem letras, como "(11) 99999-9999", viram um único termo para que o
+    telefone formatado case com os dígitos armazenados.
+    """
+    term = fold_text(query)
+    if not any(ch.isalpha() for ch in term):
+        return [(term, only_digits(term))] if term else []
+    return [(token, only_digits(token)) for token in term.split()]
+
+
+def encode_cursor(position):
+    """Serializar a posição (valor de ordenação, chave) em um cursor opaco para URLs"""
+    value, key = position
+    if isinstance(value, datetime):
+        value = {'dt': value.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps([value, key]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverso de ``encode_cursor``; levanta ValueError para cursores inválidos"""
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value['dt'])
+    except (TypeError, KeyError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Cursor inválido: {cursor!r}") from e
+    return value, key
+
+
+class TextIndex:
+    """Índice invertido de trigramas para busca por substring.
+
+    Campos em ``text`` são indexados já normalizados por ``fold_text`` (assim
+    "João" casa com "joao"); campos em ``digits`` são indexados apenas pelos
+    dígitos, de forma que telefone e CPF/CNPJ casam com ou sem formatação.
+    """
+
+    GRAM = 3
+
+    def __init__(self, text=(), digits=()):
+        self.text_fields = tuple(text)
+        self.digit_fields = tuple(digits)
+        self.postings = {}
+        self.documents = {}  # chave -> (valores normalizados por campo, trigramas)
+
+    def _grams(self, value):
+        return {value[i:i + self.GRAM] for i in range(len(value) - self.GRAM + 1)}
+
+    def _normalize(self, obj):
+        values = [fold_text(getattr(obj, field)) for field in self.text_fields]
+        values += [only_digits(getattr(obj, field)) for field in self.digit_fields]
+        return values
+
+    def add(self, key, obj):
+        self.remove(key)
+        values = self._normalize(obj)
+        grams = set()
+        for value in values:
+            grams |= self._grams(value)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(key)
+        self.documents[key] = (values, grams)
+
+    def remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        for gram in document[1]:
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def _lookup(self, term):
+        """Chaves que contêm todos os trigramas do termo (None se o termo for curto demais)"""
+        if len(term) < self.GRAM:
+            return None
+        postings = [self.postings.get(gram) for gram in self._grams(term)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        keys = set(postings[0])
+        for other in postings[1:]:
+            keys &= other
+            if not keys:
+                break
+        return keys
+
+    def _candidates(self, text, digits):
+        """Chaves que podem conter o termo (None se algum caminho não puder usar o índice)"""
+        keys = self._lookup(text)
+        if keys is None or not digits:
+            return keys
+        digit_keys = self._lookup(digits)
+        return None if digit_keys is None else keys | digit_keys
+
+    def _match(self, values, text, digits):
+        """Melhor (qualidade, campo) em que o termo aparece, ou None"""
+        n_text = len(self.text_fields)
+        best = None
+        for position, value in enumerate(values):
+            needle = text if position < n_text else digits
+            if not needle:
+                continue
+            found = value.find(needle)
+            if found < 0:
+                continue
+            if found == 0:
+                quality = 0
+            elif value[found - 1] in ' .@_-':
+                quality = 1
+            else:
+                quality = 2
+            if best is None or (quality, position) < best:
+                best = (quality, position)
+        return best
+
+    def search(self, query, limit=None):
+        """Retornar chaves ordenadas por relevância.
+
+        Cada termo da busca precisa aparecer em algum campo (texto ou, para
+        termos com números, dígitos). Prefixo do campo vale mais que início de
+        palavra, que vale mais que substring; vale o pior termo, e empates
+        seguem a ordem dos campos declarados.
+        """
+        terms = search_terms(query)
+        if not terms:
+            return []
+        candidates = None
+        for text, digits in terms:
+            keys = self._candidates(text, digits)
+            if keys is not None:
+                candidates = keys if candidates is None else candidates & keys
+        if candidates is None:
+            candidates = self.documents.keys()  # só termos curtos: verificação direta
+
+        ranked = []
+        for key in candidates:
+            values = self.documents[key][0]
+            matches = [self._match(values, text, digits) for text, digits in terms]
+            if None in matches:
+                continue
+            rank = (max(quality for quality, _ in matches), matches[0][1])
+            ranked.append((rank, values[0] if values else '', key))
+        order = lambda item: (item[0], item[1])
+        ranked = heapq.nsmallest(limit, ranked, key=order) if limit else sorted(ranked, key=order)
+        return [key for _, _, key in ranked]
+
+class MemoryStore:
+    """Armazenamento em memória (dict) usado quando nenhum banco está configurado.
+
+    Expõe a mesma interface do ``SQLStore`` em ``database.py``; os modelos
+    falam apenas com ``<Modelo>.store`` e não sabem qual backend está ativo.
+
+    ``unique`` e ``indexes`` declaram índices secundários (campo -> chave e
+    campo -> chaves) mantidos por ``save`` e ``delete``; consultas por campos
+    indexados custam O(1) ou O(resultado) em vez de O(tabela). Um índice em
+    ``indexes`` pode ser uma tupla de campos (índice composto), usada quando a
+    consulta informa todos eles. Alterações em
+    campos indexados só entram no índice quando o objeto é salvo de novo.
+    ``ordered`` mantém listas ordenadas de (valor, chave) usadas pela paginação
+    por cursor (``page``); ``grouped`` ({campo: campo de ordenação}) mantém uma
+    lista ordenada por grupo, lida por ``group``. ``text_index`` (um
+    ``TextIndex``) acelera e ordena ``search``.
+
+    É seguro para workers com threads (gthread): IDs vêm de uma sequência
+    monotônica que nunca reutiliza valores após um ``delete``.
+    """
+
+    def __init__(self, unique=(), indexes=(), ordered=(), grouped=None, text_index=None):
+        self.rows = {}
+        # Um lock por store: escritas e leituras que percorrem os índices são
+        # serializadas, e as leituras devolvem listas próprias (cópias).
+        self.lock = threading.RLock()
+        self.last_id = 0
+        self.text_index = text_index
+        self.unique = {field: {} for field in unique}
+        self.indexes = {field: {} for field in indexes}
+        self.orderings = {field: [] for field in ordered}
+        self.grouped = dict(grouped or {})
+        self.groups = {field: {} for field in self.grouped}
+        # Posição de cada registro nos índices, para localizar a entrada antiga quando o objeto muda
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def get(self, key):
+        return self.rows.get(key)
+
+    def all(self, order_by=None, reverse=False):
+        with self.lock:
+            if order_by in self.orderings:
+                entries = self.orderings[order_by]
+                return [self.rows[key] for _, key in (reversed(entries) if reverse else entries)]
+            if order_by:
+                return sorted(self.rows.values(), key=lambda obj: getattr(obj, order_by), reverse=reverse)
+            return list(self.rows.values())
+
+    def _buckets(self, criteria):
+        """Buckets dos índices (simples ou compostos) cobertos pelos critérios"""
+        buckets = []
+        for field, index in self.indexes.items():
+            if isinstance(field, tuple):
+                if all(name in criteria for name in field):
+                    buckets.append(index.get(tuple(criteria[name] for name in field), {}))
+            elif field in criteria:
+                buckets.append(index.get(criteria[field], {}))
+        return buckets
+
+    def _candidates(self, criteria):
+        """Menor conjunto de registros que pode satisfazer os critérios (chamar com o lock)"""
+        for field, value in criteria.items():
+            if field in self.unique:
+                key = self.unique[field].get(value)
+                return [] if key is None else [self.rows[key]]
+        buckets = self._buckets(criteria)
+        if buckets:
+            return [self.rows[key] for key in min(buckets, key=len)]
+        return self.rows.values()
+
+    def filter(self, **criteria):
+        with self.lock:
+            return [obj for obj in self._candidates(criteria)
+                    if all(getattr(obj, field) == value for field, value in criteria.items())]
+
+    def first(self, **criteria):
+        with self.lock:
+            for obj in self._candidates(criteria):
+                if all(getattr(obj, field) == value for field, value in criteria.items()):
+                    return obj
+            return None
+
+    def count(self, **criteria):
+        with self.lock:
+            if not criteria:
+                return len(self.rows)
+            # Um índice que cobre exatamente os critérios já tem a contagem
+            for field, index in self.indexes.items():
+                names = field if isinstance(field, tuple) else (field,)
+                if set(names) == set(criteria):
+                    value = tuple(criteria[name] for name in names) if isinstance(field, tuple) else criteria[field]
+                    return len(index.get(value, ()))
+            return len(self.filter(**criteria))
+
+    def page(self, order_by, limit, after=None, reverse=False):
+        """Paginação por cursor (keyset) sobre um campo declarado em ``ordered``.
+
+        ``after`` é a posição (valor, chave) do último item da página anterior.
+        Retorna (itens, posição do último item) — a posição é None quando não
+        há mais páginas. O custo depende do tamanho da página, não da tabela.
+        """
+        with self.lock:
+            entries = self.orderings[order_by]
+            if reverse:
+                end = bisect_left(entries, after) if after else len(entries)
+                start = max(end - limit, 0)
+                window = entries[start:end][::-1]
+                more = start > 0
+            else:
+                start = bisect_right(entries, after) if after else 0
+                window = entries[start:start + limit]
+                more = start + limit < len(entries)
+            items = [self.rows[key] for _, key in window]
+            return items, (window[-1] if more and window else None)
+
+    def group(self, field, value, limit=None, reverse=False, since=None):
+        """Registros de um grupo declarado em ``grouped``, já ordenados.
+
+        ``since`` descarta entradas com valor de ordenação anterior a ele; o
+        custo é O(log n + resultado).
+        """
+        with self.lock:
+            entries = self.groups[field].get(value, [])
+            start = bisect_left(entries, (since,)) if since is not None else 0
+            if reverse:
+                stop = start if limit is None else max(start, len(entries) - limit)
+                window = entries[stop:][::-1]
+            else:
+                window = entries[start:] if limit is None else entries[start:start + limit]
+            return [self.rows[key] for _, key in window]
+
+    def count_since(self, order_by, since, present=None):
+        """Registros com ``order_by >= since`` (campo declarado em ``ordered``).
+
+        Com ``present`` conta só os que têm esse campo preenchido. Custa
+        O(log n + registros no intervalo).
+        """
+        with self.lock:
+            entries = self.orderings[order_by]
+            window = entries[bisect_left(entries, (since,)):]
+            if present is None:
+                return len(window)
+            return sum(1 for _, key in window if getattr(self.rows[key], present) is not None)
+
+    def counts_by(self, field):
+        """Quantidade de registros por valor de um campo indexado, em O(valores distintos)"""
+        with self.lock:
+            if field in self.groups:
+                return {value: len(entries) for value, entries in self.groups[field].items()}
+            if field in self.indexes:
+                return {value: len(bucket) for value, bucket in self.indexes[field].items()}
+            counts = {}
+            for obj in self.rows.values():
+                value = getattr(obj, field)
+                counts[value] = counts.get(value, 0) + 1
+            return counts
+
+    def search(self, query, fields, limit=None):
+        with self.lock:
+            if self.text_index is not None:
+                return [self.rows[key] for key in self.text_index.search(query, limit)]
+            query = query.lower()
+            results = [obj for obj in self.rows.values()
+                       if any(query in (getattr(obj, field) or '').lower() for field in fields)]
+            return results[:limit] if limit else results
+
+    def save(self, obj):
+        with self.lock:
+            if not obj.id:
+                self.last_id += 1
+                obj.id = self.last_id
+            elif isinstance(obj.id, int):
+                self.last_id = max(self.last_id, obj.id)
+            for field, index in self.unique.items():
+                owner = index.get(getattr(obj, field))
+                if owner is not None and owner != obj.id:
+                    raise ValueError(f"Valor duplicado para {field}: {getattr(obj, field)!r}")
+            self._reindex(obj)
+            return obj
+
+    def save_many(self, objs, unique_by=None):
+        """Salvar vários registros de uma vez (inserção em lote).
+
+        Com ``unique_by`` registros cujo valor nesse campo já existe (no store
+        ou antes no próprio lote) são ignorados. Retorna os registros salvos.
+        """
+        with self.lock:
+            if unique_by:
+                seen = self.existing(unique_by, {getattr(obj, unique_by) for obj in objs})
+                fresh = []
+                for obj in objs:
+                    value = getattr(obj, unique_by)
+                    if value not in seen:
+                        seen.add(value)
+                        fresh.append(obj)
+                objs = fresh
+            for obj in objs:
+                self.save(obj)
+            return objs
+
+    def existing(self, field, values):
+        """Subconjunto de ``values`` que já aparece em ``field``"""
+        with self.lock:
+            if field in self.unique:
+                return {value for value in values if value in self.unique[field]}
+            if field in self.indexes:
+                return {value for value in values if self.indexes[field].get(value)}
+            present = {getattr(obj, field) for obj in self.rows.values()}
+            return {value for value in values if value in present}
+
+    def update(self, key, expect=None, **changes):
+        """Aplicar ``changes`` ao registro e reindexar atomicamente.
+
+        Retorna os valores anteriores dos campos alterados, ou None se o
+        registro não existir. Com ``expect`` ({campo: valor}) a alteração só
+        acontece se o registro ainda tiver esses valores (compare-and-set);
+        caso contrário também retorna None.
+        """
+        with self.lock:
+            obj = self.rows.get(key)
+            if obj is None:
+                return None
+            if expect and any(getattr(obj, field) != value for field, value in expect.items()):
+                return None
+            previous = {field: getattr(obj, field) for field in changes}
+            for field, value in changes.items():
+                setattr(obj, field, value)
+            self._reindex(obj)
+            return previous
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.rows:
+                for tag, position in self.positions.pop(key, {}).items():
+                    self._remove(tag, position, key)
+                if self.text_index is not None:
+                    self.text_index.remove(key)
+                del self.rows[key]
+                return True
+            return False
+
+    def _reindex(self, obj):
+        key = obj.id
+        old = self.positions.get(key, {})
+        new = self._positions(obj)
+        # Só os índices cujo valor mudou são tocados (mark_as_read não reordena o log)
+        for tag, position in old.items():
+            if new[tag] != position:
+                self._remove(tag, position, key)
+        self.rows[key] = obj
+        for tag, position in new.items():
+            if tag not in old or old[tag] != position:
+                self._add(tag, position, key)
+        self.positions[key] = new
+        if self.text_index is not None:
+            self.text_index.add(key, obj)
+
+    def _positions(self, obj):
+        positions = {}
+        for field in self.unique:
+            positions['unique', field] = getattr(obj, field)
+        for field in self.indexes:
+            if isinstance(field, tuple):
+                positions['index', field] = tuple(getattr(obj, name) for name in field)
+            else:
+                positions['index', field] = getattr(obj, field)
+        for field in self.orderings:
+            positions['ordered', field] = getattr(obj, field)
+        for field, order_by in self.grouped.items():
+            positions['grouped', field] = (getattr(obj, field), getattr(obj, order_by))
+        return positions
+
+    def _add(self, tag, position, key):
+        kind, field = tag
+        if kind == 'unique':
+            self.unique[field][position] = key
+        elif kind == 'index':
+            self.indexes[field].setdefault(position, {})[key] = None
+        elif kind == 'ordered':
+            insort(self.orderings[field], (position, key))
+        else:
+            value, order = position
+            insort(self.groups[field].setdefault(value, []), (order, key))
+
+    def _remove(self, tag, position, key):
+        kind, field = tag
+        if kind == 'unique':
+            self.unique[field].pop(position, None)
+        elif kind == 'index':
+            bucket = self.indexes[field][position]
+            del bucket[key]
+            if not bucket:
+                del self.indexes[field][position]
+        elif kind == 'ordered':
+            entries = self.orderings[field]
+            del entries[bisect_left(entries, (position, key))]
+        else:
+            value, order = position
+            entries = self.groups[field][value]
+            del entries[bisect_left(entries, (order, key))]
+            if not entries:
+                del self.groups[field][value]
+
+
+# In-memory storage for MVP (substituído por SQLStore quando DATABASE_URL está definido)
+users_db = MemoryStore(unique=('username',))
+clients_db = MemoryStore(indexes=('cpf_cnpj', 'insurance_type', 'status', 'phone_normalized'), ordered=('id',),
+                         text_index=TextIndex(text=('name', 'email'), digits=('phone', 'cpf_cnpj')))
+kanban_cards_db = MemoryStore(indexes=('client_id',), grouped={'column': 'updated_at'})
+whatsapp_messages_db = MemoryStore(indexes=(('read', 'message_type'), 'status', 'external_id', 'campaign_id'),
+                                   ordered=('timestamp',),
+                                   grouped={'client_id': 'timestamp'})
+campaigns_db = MemoryStore(indexes=('status',))
+sync_states_db = MemoryStore(unique=('key',))
+report_jobs_db = MemoryStore(indexes=('status',))
+leases_db = MemoryStore(unique=('key',))
+social_accounts_db = MemoryStore(indexes=('platform',))
+social_posts_db = MemoryStore(indexes=('platform', 'published'), ordered=('id',))
 scheduled_posts_db = {}
 
+class DashboardMetrics:
+    """Agregados do dashboard mantidos pelas escritas dos modelos.
+
+    Cada ``save``/``delete``/``mark_as_read``/``move_to_column`` atualiza os
+    contadores em O(1) e os cartões mais recentes ficam em um top-K limitado,
+    então ``snapshot`` custa o mesmo independentemente do volume de dados.
+    Com o backend SQL (``incremental = False``) cada worker vê apenas as
+    próprias escritas, por isso ``snapshot`` passa a consultar o banco.
+    """
+
+    RECENT_LIMIT = 10
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.incremental = True
+        self.counters = {'total_clients': 0, 'total_cards': 0, 'unread_messages': 0}
+        self.recent_cards = OrderedDict()  # id -> cartão, do menos para o mais recente
+        self.recent_stale = False
+
+    def incr(self, name, delta=1):
+        if self.incremental:
+            with self.lock:
+                self.counters[name] += delta
+
+    def card_touched(self, card):
+        if not self.incremental:
+            return
+        with self.lock:
+            self.recent_cards.pop(card.id, None)
+            self.recent_cards[card.id] = card
+            while len(self.recent_cards) > self.RECENT_LIMIT:
+                self.recent_cards.popitem(last=False)
+
+    def card_removed(self, card_id):
+        if not self.incremental:
+            return
+        with self.lock:
+            if self.recent_cards.pop(card_id, None) is not None:
+                self.recent_stale = True
+
+    def get_recent_cards(self, limit=5):
+        if not self.incremental:
+            return KanbanCard.get_recent(limit)
+        with self.lock:
+            if self.recent_stale:
+                # Um cartão do top-K foi removido: recompor a partir das colunas
+                self.recent_cards = OrderedDict((card.id, card) for card in reversed(KanbanCard.get_recent(self.RECENT_LIMIT)))
+                self.recent_stale = False
+            return list(reversed(self.recent_cards.values()))[:limit]
+
+    def snapshot(self):
+        if self.incremental:
+            with self.lock:
+                return dict(self.counters)
+        return {
+            'total_clients': Client.store.count(),
+            'total_cards': KanbanCard.store.count(),
+            'unread_messages': WhatsAppMessage.store.count(read=False, message_type='received'),
+        }
+
+
+dashboard_metrics = DashboardMetrics()
+
+
 class User(UserMixin):
+    store = users_db
+
     def __init__(self, username, email, name, role='atendimento'):
-        self.id = len(users_db) + 1
+        self.id = None
         self.username = username
         self.email = email
         self.name = name
@@ -33,34 +594,29 @@ class User(UserMixin):
     
     @staticmethod
     def save(user):
-        users_db[user.id] = user
-        return user
+        return User.store.save(user)
     
     @staticmethod
     def get(user_id):
-        return users_db.get(user_id)
+        return User.store.get(user_id)
     
     @staticmethod
     def get_by_username(username):
-        for user in users_db.values():
-            if user.username == username:
-                return user
-        return None
+        return User.store.first(username=username)
     
     @staticmethod
     def get_all():
-        return list(users_db.values())
+        return User.store.all()
     
     @staticmethod
     def delete(user_id):
-        if user_id in users_db:
-            del users_db[user_id]
-            return True
-        return False
+        return User.store.delete(user_id)
 
 class Client:
+    store = clients_db
+
     def __init__(self, name, email, phone, cpf_cnpj, address='', insurance_type='', notes=''):
-        self.id = len(clients_db) + 1
+        self.id = None
         self.name = name
         self.email = email
         self.phone = phone
@@ -71,44 +627,84 @@ class Client:
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
         self.status = 'ativo'
+        Client.normalize(self)
+    
+    @staticmethod
+    def normalize(client):
+        """Atualizar as colunas derivadas usadas em buscas: telefone sem formatação,
+        nome e email sem acentos e os dígitos de telefone e CPF/CNPJ"""
+        client.phone_normalized = normalize_phone(client.phone)
+        client.search_text = f"{fold_text(client.name)} {fold_text(client.email)}"
+        client.search_digits = f"{only_digits(client.phone)} {only_digits(client.cpf_cnpj)}"
     
     @staticmethod
     def save(client):
+        Client.normalize(client)
         if hasattr(client, 'id') and client.id:
             client.updated_at = datetime.now()
-        else:
-            client.id = len(clients_db) + 1
-        clients_db[client.id] = client
+            return Client.store.save(client)
+        Client.store.save(client)
+        dashboard_metrics.incr('total_clients')
         return client
     
     @staticmethod
     def get(client_id):
-        return clients_db.get(client_id)
+        return Client.store.get(client_id)
     
     @staticmethod
     def get_all():
-        return list(clients_db.values())
+        return Client.store.all()
     
     @staticmethod
     def delete(client_id):
-        if client_id in clients_db:
-            del clients_db[client_id]
+        if Client.store.delete(client_id):
+            dashboard_metrics.incr('total_clients', -1)
             return True
         return False
     
     @staticmethod
-    def search(query):
-        results = []
-        query = query.lower()
-        for client in clients_db.values():
-            if (query in client.name.lower() or 
-                query in client.email.lower() or 
-                query in client.phone.lower() or
-                query in client.cpf_cnpj.lower()):
-                results.append(client)
-        return results
+    def get_page(cursor=None, limit=50):
+        """Página de clientes por ordem de cadastro; retorna (clientes, próximo cursor)"""
+        after = decode_cursor(cursor) if cursor else None
+        clients, last = Client.store.page('id', limit, after)
+        return clients, (encode_cursor(last) if last else None)
+    
+    @staticmethod
+    def search(query, limit=None):
+        return Client.store.search(query, ('name', 'email', 'phone', 'cpf_cnpj'), limit)
+    
+    @staticmethod
+    def get_by_phone(phone):
+        return Client.store.first(phone_normalized=normalize_phone(phone))
+    
+    @staticmethod
+    def get_segment(insurance_type=None, status=None, created_from=None, created_to=None):
+        """Clientes de um segmento (filtros vazios são ignorados), em ordem de ID"""
+        criteria = {field: value for field, value in (('insurance_type', insurance_type), ('status', status)) if value}
+        clients = Client.store.filter(**criteria) if criteria else Client.store.all()
+        return sorted((client for client in clients
+                       if (created_from is None or client.created_at >= created_from)
+                       and (created_to is None or client.created_at < created_to)),
+                      key=lambda client: client.id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'email': self.email,
+            'phone': self.phone,
+            'cpf_cnpj': self.cpf_cnpj,
+            'address': self.address,
+            'insurance_type': self.insurance_type,
+            'notes': self.notes,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+        }
 
 class KanbanCard:
+    store = kanban_cards_db
+    COLUMNS = ('atendimento_inicial', 'proposta_enviada', 'venda_andamento', 'venda_concluida', 'pos_venda')
+
     def __init__(self, title, description, client_id, assigned_to, column='atendimento_inicial'):
         self.id = str(uuid.uuid4())
         self.title = title
@@ -124,71 +720,192 @@ class KanbanCard:
     @staticmethod
     def save(card):
         card.updated_at = datetime.now()
-        kanban_cards_db[card.id] = card
+        is_new = dashboard_metrics.incremental and card.id not in KanbanCard.store
+        KanbanCard.store.save(card)
+        if is_new:
+            dashboard_metrics.incr('total_cards')
+        dashboard_metrics.card_touched(card)
         return card
     
     @staticmethod
     def get(card_id):
-        return kanban_cards_db.get(card_id)
+        return KanbanCard.store.get(card_id)
     
     @staticmethod
     def get_all():
-        return list(kanban_cards_db.values())
+        return KanbanCard.store.all()
     
     @staticmethod
-    def get_by_column(column):
-        return [card for card in kanban_cards_db.values() if card.column == column]
+    def get_by_column(column, limit=None):
+        """Cartões da coluna, do menos para o mais recentemente atualizado"""
+        return KanbanCard.store.group('column', column, limit)
+    
+    @staticmethod
+    def count_by_column():
+        counts = KanbanCard.store.counts_by('column')
+        return {column: counts.get(column, 0) for column in KanbanCard.COLUMNS}
+    
+    @staticmethod
+    def get_by_client(client_id):
+        return KanbanCard.store.filter(client_id=client_id)
+    
+    @staticmethod
+    def get_recent(limit=5):
+        """Cartões atualizados mais recentemente, combinando o fim de cada coluna"""
+        candidates = []
+        for column in KanbanCard.COLUMNS:
+            candidates.extend(KanbanCard.store.group('column', column, limit, reverse=True))
+        return heapq.nlargest(limit, candidates, key=lambda card: card.updated_at)
     
     @staticmethod
     def delete(card_id):
-        if card_id in kanban_cards_db:
-            del kanban_cards_db[card_id]
+        if KanbanCard.store.delete(card_id):
+            dashboard_metrics.incr('total_cards', -1)
+            dashboard_metrics.card_removed(card_id)
             return True
         return False
     
     @staticmethod
     def move_to_column(card_id, new_column):
-        card = kanban_cards_db.get(card_id)
-        if card:
-            card.column = new_column
-            card.updated_at = datetime.now()
-            return True
-        return False
+        if new_column not in KanbanCard.COLUMNS:
+            return False
+        if KanbanCard.store.update(card_id, column=new_column, updated_at=datetime.now()) is None:
+            return False
+        dashboard_metrics.card_touched(KanbanCard.store.get(card_id))
+        return True
 
 class WhatsAppMessage:
-    def __init__(self, sender, message, message_type='received', client_id=None):
-        self.id = len(whatsapp_messages_db) + 1
+    store = whatsapp_messages_db
+
+    # Ciclo de vida das mensagens enviadas pela fila (services/whatsapp_queue.py);
+    # 'sending' marca a mensagem reservada por um worker
+    STATUSES = ('queued', 'sending', 'sent', 'delivered', 'failed')
+
+    def __init__(self, sender, message, message_type='received', client_id=None, recipient=None, status=None,
+                 campaign_id=None):
+        self.id = None
         self.sender = sender
         self.message = message
         self.message_type = message_type  # received, sent
         self.client_id = client_id
         self.timestamp = datetime.now()
         self.read = False
+        self.recipient = recipient  # número de destino das mensagens enviadas
+        self.status = status
+        self.external_id = None  # ID da mensagem na WhatsApp Cloud API (wamid)
+        self.attempts = 0
+        self.error = None
+        self.campaign_id = campaign_id
+        self.claimed_at = None  # quando um worker reservou a mensagem (status 'sending')
     
     @staticmethod
     def save(message):
-        whatsapp_messages_db[message.id] = message
+        is_new = not message.id
+        WhatsAppMessage.store.save(message)
+        if is_new and message.message_type == 'received' and not message.read:
+            dashboard_metrics.incr('unread_messages')
         return message
     
+    @staticmethod
+    def save_many(messages):
+        """Inserir mensagens em lote (webhook), ignorando IDs externos já gravados.
+
+        Atualiza o contador de não lidas uma vez e retorna as mensagens inseridas.
+        """
+        messages = WhatsAppMessage.store.save_many(messages, unique_by='external_id')
+        unread = sum(1 for message in messages if message.message_type == 'received' and not message.read)
+        if unread:
+            dashboard_metrics.incr('unread_messages', unread)
+        return messages
+    
     @staticmethod
     def get_all():
-        return sorted(whatsapp_messages_db.values(), key=lambda x: x.timestamp, reverse=True)
+        return WhatsAppMessage.store.all(order_by='timestamp', reverse=True)
     
     @staticmethod
-    def get_by_client(client_id):
-        return [msg for msg in whatsapp_messages_db.values() if msg.client_id == client_id]
+    def get_page(cursor=None, limit=50):
+        """Página de mensagens, das mais recentes para as mais antigas; retorna (mensagens, próximo cursor)"""
+        after = decode_cursor(cursor) if cursor else None
+        messages, last = WhatsAppMessage.store.page('timestamp', limit, after, reverse=True)
+        return messages, (encode_cursor(last) if last else None)
+    
+    @staticmethod
+    def get_latest(limit=20):
+        return WhatsAppMessage.store.page('timestamp', limit, reverse=True)[0]
+    
+    @staticmethod
+    def get_by_client(client_id, since=None, limit=None):
+        """Conversa com o cliente em ordem cronológica (opcionalmente a partir de ``since``)"""
+        return WhatsAppMessage.store.group('client_id', client_id, limit, since=since)
+    
+    @staticmethod
+    def get_unread():
+        return WhatsAppMessage.store.filter(read=False, message_type='received')
+    
+    @staticmethod
+    def get_by_status(status):
+        return WhatsAppMessage.store.filter(status=status)
+    
+    @staticmethod
+    def count_by_campaign(campaign_id):
+        """Mensagens da campanha agrupadas por status de envio"""
+        counts = {}
+        for message in WhatsAppMessage.store.filter(campaign_id=campaign_id):
+            counts[message.status] = counts.get(message.status, 0) + 1
+        return counts
+    
+    @staticmethod
+    def count_campaign_sends(since):
+        """Mensagens de campanha criadas desde ``since`` (todas as campanhas)"""
+        return WhatsAppMessage.store.count_since('timestamp', since, present='campaign_id')
+    
+    @staticmethod
+    def get_by_external_id(external_id):
+        return WhatsAppMessage.store.first(external_id=external_id)
+    
+    @staticmethod
+    def existing_external_ids(external_ids):
+        return WhatsAppMessage.store.existing('external_id', external_ids)
+    
+    @staticmethod
+    def update_status(message_id, status, expect=None, **changes):
+        """Mudar o status de envio; com ``expect`` só muda se o status atual for esse.
+
+        Retorna True se a mensagem foi alterada.
+        """
+        criteria = {'status': expect} if expect else None
+        return WhatsAppMessage.store.update(message_id, expect=criteria, status=status, **changes) is not None
+    
+    @staticmethod
+    def count_unread():
+        return dashboard_metrics.snapshot()['unread_messages']
     
     @staticmethod
     def mark_as_read(message_id):
-        message = whatsapp_messages_db.get(message_id)
-        if message:
-            message.read = True
-            return True
-        return False
+        previous = WhatsAppMessage.store.update(message_id, read=True)
+        if previous is None:
+            return False
+        if not previous['read'] and WhatsAppMessage.store.get(message_id).message_type == 'received':
+            dashboard_metrics.incr('unread_messages', -1)
+        return True
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sender': self.sender,
+            'message': self.message,
+            'message_type': self.message_type,
+            'client_id': self.client_id,
+            'timestamp': self.timestamp.isoformat(),
+            'read': self.read,
+            'status': self.status,
+        }
 
 class SocialAccount:
+    store = social_accounts_db
+
     def __init__(self, platform, account_id, name, access_token=None):
-        self.id = len(social_accounts_db) + 1
+        self.id = None
         self.platform = platform  # whatsapp, instagram, facebook
         self.account_id = account_id
         self.name = name
@@ -199,24 +916,26 @@ class SocialAccount:
     
     @staticmethod
     def save(account):
-        social_accounts_db[account.id] = account
-        return account
+        return SocialAccount.store.save(account)
     
     @staticmethod
     def get_all():
-        return list(social_accounts_db.values())
+        return SocialAccount.store.all()
     
     @staticmethod
     def get_by_platform(platform):
-        return [acc for acc in social_accounts_db.values() if acc.platform == platform]
+        return SocialAccount.store.filter(platform=platform)
 
 class SocialPost:
+    store = social_posts_db
+
     def __init__(self, account_id, content, platform, post_type='text'):
-        self.id = len(social_posts_db) + 1
+        self.id = None
         self.account_id = account_id
         self.content = content
         self.platform = platform
         self.post_type = post_type  # text, image, video
+        self.media_url = None  # imagem pública, obrigatória para o Instagram
         self.scheduled_time = None
         self.published = False
         self.published_at = None
@@ -230,17 +949,206 @@ class SocialPost:
     
     @staticmethod
     def save(post):
-        social_posts_db[post.id] = post
-        return post
+        return SocialPost.store.save(post)
     
     @staticmethod
     def get_all():
-        return list(social_posts_db.values())
+        return SocialPost.store.all()
     
     @staticmethod
     def get_by_platform(platform):
-        return [post for post in social_posts_db.values() if post.platform == platform]
+        return SocialPost.store.filter(platform=platform)
+    
+    @staticmethod
+    def get(post_id):
+        return SocialPost.store.get(post_id)
     
     @staticmethod
     def get_scheduled():
-        return [post for post in social_posts_db.values() if post.scheduled_time and not post.published]
+        return [post for post in SocialPost.store.filter(published=False) if post.scheduled_time]
+    
+    @staticmethod
+    def get_created_after(post_id, limit=500):
+        """Posts com ID maior que ``post_id``, em ordem de criação"""
+        return SocialPost.store.page('id', limit, after=(post_id, post_id))[0]
+
+class Campaign:
+    """Campanha de mensagens WhatsApp para um segmento de clientes (services/campaigns.py)"""
+    store = campaigns_db
+
+    def __init__(self, name, template, insurance_type='', client_status='', created_from=None, created_to=None,
+                 created_by=None):
+        self.id = None
+        self.name = name
+        self.template = template
+        self.insurance_type = insurance_type
+        self.client_status = client_status
+        self.created_from = created_from
+        self.created_to = created_to
+        self.created_by = created_by
+        self.status = 'running'  # running, paused, completed
+        self.total = 0
+        self.last_client_id = 0  # último cliente já enfileirado; a campanha retoma a partir dele
+        self.created_at = datetime.now()
+        self.finished_at = None
+    
+    @staticmethod
+    def save(campaign):
+        return Campaign.store.save(campaign)
+    
+    @staticmethod
+    def get(campaign_id):
+        return Campaign.store.get(campaign_id)
+    
+    @staticmethod
+    def get_all():
+        return Campaign.store.all(order_by='created_at', reverse=True)
+    
+    @staticmethod
+    def get_by_status(status):
+        return Campaign.store.filter(status=status)
+    
+    @staticmethod
+    def set_status(campaign_id, status, expect, **changes):
+        """Mudar o status apenas se o atual for ``expect``; retorna True se mudou"""
+        return Campaign.store.update(campaign_id, expect={'status': expect}, status=status, **changes) is not None
+    
+    @staticmethod
+    def is_running(campaign_id):
+        """Consultar o status atual no store (sem passar por objetos já carregados na sessão)"""
+        return Campaign.store.count(id=campaign_id, status='running') > 0
+    
+    @staticmethod
+    def advance(campaign_id, last_client_id, client_id):
+        """Reservar ``client_id`` como próximo destinatário (compare-and-set em last_client_id).
+
+        Falha se a campanha foi pausada ou se outro runner já avançou.
+        """
+        previous = Campaign.store.update(campaign_id, expect={'status': 'running', 'last_client_id': last_client_id},
+                                         last_client_id=client_id)
+        return previous is not None
+
+    def get_segment(self):
+        return Client.get_segment(self.insurance_type, self.client_status, self.created_from, self.created_to)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'total': self.total,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class SyncState:
+    """Marca d'água da sincronização incremental de uma conta (services/sync.py).
+
+    ``watermark`` é o instante (UTC) do item mais recente já importado e
+    ``seen_ids`` os IDs com esse mesmo instante, para não perder nem repetir
+    itens empatados no limite.
+    """
+    store = sync_states_db
+
+    def __init__(self, key):
+        self.id = None
+        self.key = key  # ex.: "whatsapp:<phone_id>", "instagram:<ig_id>"
+        self.watermark = None
+        self.seen_ids = []
+        self.updated_at = datetime.now()
+    
+    @staticmethod
+    def get_or_create(key):
+        return SyncState.store.first(key=key) or SyncState(key)
+    
+    @staticmethod
+    def save(state):
+        state.updated_at = datetime.now()
+        return SyncState.store.save(state)
+
+class ReportJob:
+    """Geração de relatório em segundo plano (services/report_jobs.py)"""
+    store = report_jobs_db
+
+    def __init__(self, report_type, file_format, requested_by=None):
+        self.id = None
+        self.report_type = report_type  # clients, sales, social
+        self.file_format = file_format  # excel, pdf
+        self.requested_by = requested_by
+        self.status = 'queued'  # queued, running, done, failed
+        self.progress = 0
+        self.filepath = None
+        self.error = None
+        self.created_at = datetime.now()
+        self.heartbeat_at = None  # última atividade do worker que gera o job (status 'running')
+        self.finished_at = None
+    
+    @staticmethod
+    def save(job):
+        return ReportJob.store.save(job)
+    
+    @staticmethod
+    def get(job_id):
+        return ReportJob.store.get(job_id)
+    
+    @staticmethod
+    def get_by_status(status):
+        return ReportJob.store.filter(status=status)
+    
+    @staticmethod
+    def set_status(job_id, status, expect, **changes):
+        """Mudar o status apenas se o atual for ``expect``; retorna True se mudou"""
+        return ReportJob.store.update(job_id, expect={'status': expect}, status=status, **changes) is not None
+    
+    @staticmethod
+    def delete(job_id):
+        return ReportJob.store.delete(job_id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'report_type': self.report_type,
+            'file_format': self.file_format,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class Lease:
+    """Tarefa que só um processo deve executar por vez (ex.: publicador de posts).
+
+    O dono (``holder``) renova o prazo antes de ``expires_at``; se o processo
+    morre, outro assume depois que o prazo vence. Criação e troca de dono são
+    compare-and-set, então dois processos nunca se consideram donos ao mesmo tempo.
+    """
+    store = leases_db
+
+    def __init__(self, key, holder=None, expires_at=None):
+        self.id = None
+        self.key = key  # ex.: "post-scheduler"
+        self.holder = holder  # "<host>:<pid>" do processo dono
+        self.expires_at = expires_at
+
+    @staticmethod
+    def acquire(key, holder, ttl):
+        """Assumir ou renovar ``key`` para ``holder`` por ``ttl`` segundos; retorna True se é o dono"""
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=ttl)
+        lease = Lease.store.first(key=key)
+        if lease is None:
+            return bool(Lease.store.save_many([Lease(key, holder, expires_at)], unique_by='key'))
+        current_holder, current_expiry = lease.holder, lease.expires_at
+        if current_holder != holder and current_expiry and current_expiry > now:
+            return False
+        return Lease.store.update(lease.id, expect={'holder': current_holder, 'expires_at': current_expiry},
+                                  holder=holder, expires_at=expires_at) is not None
+
+    @staticmethod
+    def release(key, holder):
+        """Liberar ``key`` se ``holder`` ainda for o dono"""
+        lease = Lease.store.first(key=key)
+        if lease is not None and lease.holder == holder:
+            Lease.store.update(lease.id, expect={'holder': holder}, expires_at=None)
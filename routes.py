@@ -1,13 +1,41 @@
 from flask import render_template, request, redirect, url_for, flash, jsonify, send_file, Response
 from flask_login import login_user, logout_user, login_required, current_user
 from app import app
-from models import User, Client, KanbanCard, WhatsAppMessage, SocialAccount, SocialPost
-from services.meta_api import MetaBusinessAPI
-from services.report_generator import ReportGenerator
+from models import (User, Client, KanbanCard, WhatsAppMessage, SocialAccount, SocialPost, Campaign, ReportJob,
+                    dashboard_metrics)
+from services.meta_api import get_meta_api, response_cache
+from services.report_jobs import (report_jobs, REPORT_FORMATS, JOB_FORMATS, MONTHLY_PERFORMANCE, load_report_data,
+                                  report_version, generate_report, write_report_excel, report_filename)
+from services.report_cache import report_cache
+from services.whatsapp_queue import outbound_queue
+from services.campaigns import campaign_runner
+from services.webhooks import VERIFY_TOKEN as WEBHOOK_VERIFY_TOKEN, verify_signature, handle_payload
+from services import sync as incremental_sync
+from services.post_scheduler import post_scheduler, publish_post
 from datetime import datetime, timedelta
+from io import BytesIO
 import json
 import os
 
+# Paginação das listagens
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SEARCH_RESULTS_LIMIT = 100
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+WHATSAPP_STATUS_LABELS = {
+    'queued': 'Na fila',
+    'sending': 'Enviando',
+    'sent': 'Enviada',
+    'delivered': 'Entregue',
+    'failed': 'Falhou',
+}
+
+def page_limit(default=PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parâmetro ``limit`` da requisição, limitado ao intervalo [1, maximum]"""
+    return max(1, min(request.args.get('limit', default, type=int), maximum))
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -39,27 +67,19 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Calculate dashboard metrics
-    total_clients = len(Client.get_all())
-    total_cards = len(KanbanCard.get_all())
-    unread_messages = len([msg for msg in WhatsAppMessage.get_all() if not msg.read])
+    # Dashboard metrics (mantidas incrementalmente pelos modelos)
+    metrics = dashboard_metrics.snapshot()
     
     # Sales pipeline stats
-    pipeline_stats = {
-        'atendimento_inicial': len(KanbanCard.get_by_column('atendimento_inicial')),
-        'proposta_enviada': len(KanbanCard.get_by_column('proposta_enviada')),
-        'venda_andamento': len(KanbanCard.get_by_column('venda_andamento')),
-        'venda_concluida': len(KanbanCard.get_by_column('venda_concluida')),
-        'pos_venda': len(KanbanCard.get_by_column('pos_venda'))
-    }
+    pipeline_stats = KanbanCard.count_by_column()
     
-    # Recent activities (last 10 cards)
-    recent_cards = sorted(KanbanCard.get_all(), key=lambda x: x.updated_at, reverse=True)[:5]
+    # Recent activities (last 5 cards)
+    recent_cards = dashboard_metrics.get_recent_cards(5)
     
     return render_template('dashboard.html', 
-                         total_clients=total_clients,
-                         total_cards=total_cards,
-                         unread_messages=unread_messages,
+                         total_clients=metrics['total_clients'],
+                         total_cards=metrics['total_cards'],
+                         unread_messages=metrics['unread_messages'],
                          pipeline_stats=pipeline_stats,
                          recent_cards=recent_cards)
 
@@ -67,12 +87,38 @@ def dashboard():
 @login_required
 def clients():
     search = request.args.get('search', '')
+    next_cursor = None
     if search:
-        client_list = Client.search(search)
+        client_list = Client.search(search, limit=SEARCH_RESULTS_LIMIT)
     else:
-        client_list = Client.get_all()
+        client_list, next_cursor = Client.get_page(limit=PAGE_SIZE)
     
-    return render_template('clients.html', clients=client_list, search=search)
+    return render_template('clients.html', clients=client_list, search=search,
+                           clients_data=[client.to_dict() for client in client_list],
+                           next_cursor=next_cursor,
+                           search_limited=len(client_list) == SEARCH_RESULTS_LIMIT)
+
+@app.route('/api/clients')
+@login_required
+def list_clients_api():
+    """API de paginação por cursor para "carregar mais" clientes"""
+    limit = page_limit()
+    try:
+        client_list, next_cursor = Client.get_page(request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': [client.to_dict() for client in client_list], 'next_cursor': next_cursor})
+
+@app.route('/api/clients/search')
+@login_required
+def search_clients_api():
+    """API de busca incremental (typeahead) de clientes"""
+    query = request.args.get('q', '').strip()
+    limit = page_limit(default=8, maximum=50)
+    if len(query) < 2:
+        return jsonify({'results': []})
+    results = Client.search(query, limit=limit)
+    return jsonify({'results': [client.to_dict() for client in results]})
 
 @app.route('/clients/new', methods=['GET', 'POST'])
 @login_required
@@ -91,7 +137,7 @@ def new_client():
         flash('Cliente criado com sucesso!', 'success')
         return redirect(url_for('clients'))
     
-    return render_template('clients.html', show_form=True)
+    return render_template('clients.html', show_form=True, clients_data=[])
 
 @app.route('/clients/<int:client_id>/edit', methods=['POST'])
 @login_required
@@ -125,13 +171,7 @@ def delete_client(client_id):
 @app.route('/kanban')
 @login_required
 def kanban():
-    columns = {
-        'atendimento_inicial': KanbanCard.get_by_column('atendimento_inicial'),
-        'proposta_enviada': KanbanCard.get_by_column('proposta_enviada'),
-        'venda_andamento': KanbanCard.get_by_column('venda_andamento'),
-        'venda_concluida': KanbanCard.get_by_column('venda_concluida'),
-        'pos_venda': KanbanCard.get_by_column('pos_venda')
-    }
+    columns = {column: KanbanCard.get_by_column(column) for column in KanbanCard.COLUMNS}
     
     clients = Client.get_all()
     users = User.get_all()
@@ -174,9 +214,20 @@ def delete_kanban_card(card_id):
 @app.route('/whatsapp')
 @login_required
 def whatsapp():
-    messages = WhatsAppMessage.get_all()
-    clients = Client.get_all()
-    return render_template('whatsapp.html', messages=messages, clients=clients)
+    messages, next_cursor = WhatsAppMessage.get_page(limit=PAGE_SIZE)
+    return render_template('whatsapp.html', messages=messages, next_cursor=next_cursor,
+                           status_labels=WHATSAPP_STATUS_LABELS)
+
+@app.route('/api/whatsapp/messages')
+@login_required
+def list_whatsapp_messages_api():
+    """API de paginação por cursor para carregar mensagens mais antigas"""
+    limit = page_limit()
+    try:
+        messages, next_cursor = WhatsAppMessage.get_page(request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': [message.to_dict() for message in messages], 'next_cursor': next_cursor})
 
 @app.route('/whatsapp/send', methods=['POST'])
 @login_required
@@ -209,6 +260,10 @@ def new_user():
         flash('Acesso negado.', 'danger')
         return redirect(url_for('dashboard'))
     
+    if User.get_by_username(request.form['username']):
+        flash('Nome de usuário já está em uso!', 'danger')
+        return redirect(url_for('users'))
+    
     user = User(
         username=request.form['username'],
         email=request.form['email'],
@@ -242,74 +297,104 @@ def delete_user(user_id):
 @login_required
 def reports():
     # Generate basic reports
-    total_clients = len(Client.get_all())
-    total_sales = len(KanbanCard.get_by_column('venda_concluida'))
+    total_clients = dashboard_metrics.snapshot()['total_clients']
+    pipeline_stats = KanbanCard.count_by_column()
+    total_sales = pipeline_stats['venda_concluida']
     pipeline_conversion = {
-        'leads': len(KanbanCard.get_by_column('atendimento_inicial')),
-        'proposals': len(KanbanCard.get_by_column('proposta_enviada')),
-        'in_progress': len(KanbanCard.get_by_column('venda_andamento')),
-        'closed': len(KanbanCard.get_by_column('venda_concluida'))
+        'leads': pipeline_stats['atendimento_inicial'],
+        'proposals': pipeline_stats['proposta_enviada'],
+        'in_progress': pipeline_stats['venda_andamento'],
+        'closed': pipeline_stats['venda_concluida']
     }
     
-    # Monthly performance (mock data for MVP)
-    monthly_performance = [
-        {'month': 'Janeiro', 'sales': 15, 'revenue': 45000},
-        {'month': 'Fevereiro', 'sales': 18, 'revenue': 54000},
-        {'month': 'Março', 'sales': 22, 'revenue': 66000},
-        {'month': 'Abril', 'sales': 20, 'revenue': 60000},
-        {'month': 'Maio', 'sales': 25, 'revenue': 75000},
-        {'month': 'Junho', 'sales': 28, 'revenue': 84000}
-    ]
-    
     return render_template('reports.html', 
                          total_clients=total_clients,
                          total_sales=total_sales,
                          pipeline_conversion=pipeline_conversion,
-                         monthly_performance=monthly_performance)
+                         monthly_performance=MONTHLY_PERFORMANCE)
 
 # WhatsApp Business Integration Routes
 @app.route('/whatsapp/real-send', methods=['POST'])
 @login_required
 def send_real_whatsapp_message():
-    """Enviar mensagem real via WhatsApp Business API"""
+    """Enfileirar mensagem para envio via WhatsApp Business API"""
     try:
-        meta_api = MetaBusinessAPI()
-        to_number = request.form['to_number']
-        message = request.form['message']
-        
-        result = meta_api.send_whatsapp_message(to_number, message)
-        
-        if result:
-            # Salvar mensagem enviada no banco
-            whatsapp_msg = WhatsAppMessage(
-                sender=current_user.name,
-                message=message,
-                message_type='sent',
-                client_id=int(request.form['client_id']) if request.form.get('client_id') else None
-            )
-            WhatsAppMessage.save(whatsapp_msg)
-            flash('Mensagem WhatsApp enviada com sucesso!', 'success')
-        else:
-            flash('Erro ao enviar mensagem WhatsApp. Verifique a configuração da API.', 'danger')
+        outbound_queue.enqueue(
+            request.form['to_number'],
+            request.form['message'],
+            sender=current_user.name,
+            client_id=int(request.form['client_id']) if request.form.get('client_id') else None
+        )
+        flash('Mensagem WhatsApp colocada na fila de envio!', 'success')
     except Exception as e:
         flash(f'Erro na integração WhatsApp: {str(e)}', 'danger')
     
     return redirect(url_for('whatsapp'))
 
+# WhatsApp Campaigns
+@app.route('/campaigns')
+@login_required
+def campaigns():
+    campaigns = Campaign.get_all()
+    progress = {campaign.id: campaign_runner.progress(campaign.id) for campaign in campaigns}
+    return render_template('campaigns.html', campaigns=campaigns, progress=progress)
+
+@app.route('/campaigns/new', methods=['POST'])
+@login_required
+def new_campaign():
+    try:
+        created_from = request.form.get('created_from')
+        created_to = request.form.get('created_to')
+        campaign = Campaign(
+            name=request.form['name'],
+            template=request.form['template'],
+            insurance_type=request.form.get('insurance_type', ''),
+            client_status=request.form.get('client_status', ''),
+            created_from=datetime.strptime(created_from, '%Y-%m-%d') if created_from else None,
+            created_to=datetime.strptime(created_to, '%Y-%m-%d') + timedelta(days=1) if created_to else None,
+            created_by=current_user.id
+        )
+        campaign_runner.start(campaign)
+        flash(f'Campanha iniciada para {campaign.total} clientes!', 'success')
+    except ValueError:
+        flash('Data inválida no filtro da campanha', 'danger')
+    return redirect(url_for('campaigns'))
+
+@app.route('/campaigns/<int:campaign_id>/pause', methods=['POST'])
+@login_required
+def pause_campaign(campaign_id):
+    if campaign_runner.pause(campaign_id):
+        flash('Campanha pausada', 'success')
+    else:
+        flash('A campanha não está em andamento', 'warning')
+    return redirect(url_for('campaigns'))
+
+@app.route('/campaigns/<int:campaign_id>/resume', methods=['POST'])
+@login_required
+def resume_campaign(campaign_id):
+    if campaign_runner.resume(campaign_id):
+        flash('Campanha retomada', 'success')
+    else:
+        flash('A campanha não está pausada', 'warning')
+    return redirect(url_for('campaigns'))
+
+@app.route('/api/campaigns/<int:campaign_id>/progress')
+@login_required
+def campaign_progress_api(campaign_id):
+    progress = campaign_runner.progress(campaign_id)
+    if progress is None:
+        return jsonify({'error': 'Campanha não encontrada'}), 404
+    return jsonify(progress)
+
 @app.route('/whatsapp/sync')
 @login_required
 def sync_whatsapp_messages():
-    """Sincronizar mensagens do WhatsApp Business"""
+    """Sincronização manual (recuperação); o fluxo normal chega pelo webhook"""
     try:
-        meta_api = MetaBusinessAPI()
-        messages = meta_api.get_whatsapp_messages()
+        received = incremental_sync.sync_whatsapp_messages(get_meta_api())
         
-        if messages and 'data' in messages:
-            for msg_data in messages['data']:
-                # Processar e salvar mensagens recebidas
-                # Implementar lógica de sincronização
-                pass
-            flash(f'Sincronizadas {len(messages["data"])} mensagens do WhatsApp', 'success')
+        if received:
+            flash(f'Sincronizadas {received} mensagens novas do WhatsApp', 'success')
         else:
             flash('Nenhuma mensagem nova encontrada', 'info')
     except Exception as e:
@@ -317,12 +402,31 @@ def sync_whatsapp_messages():
     
     return redirect(url_for('whatsapp'))
 
+# Meta Webhooks (WhatsApp Cloud API e Messenger)
+@app.route('/webhooks/meta', methods=['GET'])
+def verify_meta_webhook():
+    """Handshake de verificação feito pela Meta ao cadastrar o webhook"""
+    if (request.args.get('hub.mode') == 'subscribe' and WEBHOOK_VERIFY_TOKEN
+            and request.args.get('hub.verify_token') == WEBHOOK_VERIFY_TOKEN):
+        return request.args.get('hub.challenge', ''), 200
+    return 'Forbidden', 403
+
+@app.route('/webhooks/meta', methods=['POST'])
+def receive_meta_webhook():
+    """Receber mensagens e status de entrega enviados pela Meta"""
+    if not verify_signature(request.get_data(), request.headers.get('X-Hub-Signature-256', '')):
+        return jsonify({'error': 'Assinatura inválida'}), 403
+    result = handle_payload(request.get_json(silent=True))
+    if result is None:
+        return jsonify({'error': 'Payload inválido'}), 400
+    return jsonify(result)
+
 # Social Media Management Routes
 @app.route('/social')
 @login_required
 def social_media():
     """Página principal de gerenciamento de redes sociais"""
-    meta_api = MetaBusinessAPI()
+    meta_api = get_meta_api()
     
     # Obter contas conectadas
     social_accounts = SocialAccount.get_all()
@@ -346,7 +450,8 @@ def social_media():
 def connect_social_accounts():
     """Conectar contas de redes sociais"""
     try:
-        meta_api = MetaBusinessAPI()
+        meta_api = get_meta_api()
+        response_cache.invalidate('accounts')
         all_accounts = meta_api.get_all_social_accounts()
         
         # Salvar contas encontradas
@@ -376,6 +481,28 @@ def connect_social_accounts():
     
     return redirect(url_for('social_media'))
 
+@app.route('/social/accounts/<int:account_id>/sync')
+@login_required
+def sync_social_account(account_id):
+    """Buscar só o que mudou desde a última sincronização da conta"""
+    account = SocialAccount.store.get(account_id)
+    if account is None:
+        flash('Conta não encontrada!', 'danger')
+        return redirect(url_for('social_media'))
+    try:
+        meta_api = get_meta_api()
+        if account.platform == 'instagram':
+            media = incremental_sync.sync_instagram_media(meta_api, account)
+            flash(f'{len(media)} publicações novas importadas do Instagram', 'success')
+        elif account.platform == 'facebook':
+            conversations = incremental_sync.sync_facebook_conversations(meta_api, account)
+            flash(f'{len(conversations)} conversas do Facebook atualizadas', 'success')
+        else:
+            flash('Sincronização não disponível para esta conta', 'info')
+    except Exception as e:
+        flash(f'Erro na sincronização: {str(e)}', 'danger')
+    return redirect(url_for('social_media'))
+
 @app.route('/social/post/new', methods=['POST'])
 @login_required
 def create_social_post():
@@ -392,23 +519,22 @@ def create_social_post():
             platform=platform
         )
         
+        post.media_url = request.form.get('media_url') or None
+        scheduled_time = request.form.get('scheduled_time')
+        
         # Se for para publicar imediatamente
         if request.form.get('publish_now'):
-            meta_api = MetaBusinessAPI()
-            
-            if platform == 'facebook':
-                account = next((acc for acc in SocialAccount.get_all() if acc.id == int(account_id)), None)
-                if account:
-                    result = meta_api.create_facebook_post(account.account_id, account.access_token, content)
-                    if result:
-                        post.published = True
-                        post.published_at = datetime.now()
-            
-            elif platform == 'instagram':
+            if publish_post(post):
+                post.published = True
+                post.published_at = datetime.now()
+            elif platform == 'instagram' and not post.media_url:
                 # Para Instagram seria necessário ter uma imagem
                 flash('Para Instagram é necessário adicionar uma imagem', 'warning')
+        elif scheduled_time:
+            post.scheduled_time = datetime.strptime(scheduled_time, '%Y-%m-%dT%H:%M')
         
         SocialPost.save(post)
+        post_scheduler.schedule(post)
         flash('Post criado com sucesso!', 'success')
         
     except Exception as e:
@@ -417,27 +543,38 @@ def create_social_post():
     return redirect(url_for('social_media'))
 
 # Reports Routes
+def send_report(report_type, file_format):
+    """Enviar o relatório do cache ou gerá-lo; planilhas novas vão da memória direto para a resposta"""
+    data = load_report_data(report_type)
+    version = report_version(report_type, data)
+    download_name = report_filename(report_type, file_format)
+    
+    cached = report_cache.get(report_type, file_format, version)
+    if cached:
+        return send_file(cached, as_attachment=True, download_name=download_name)
+    
+    if file_format == 'excel':
+        output = BytesIO()
+        write_report_excel(report_type, data, output)
+        report_cache.put_bytes(report_type, file_format, version, output.getvalue())
+        output.seek(0)
+        return send_file(output, as_attachment=True, download_name=download_name, mimetype=XLSX_MIMETYPE)
+    
+    filepath = report_cache.put_file(report_type, file_format, version,
+                                     generate_report(report_type, file_format, data))
+    return send_file(filepath, as_attachment=True, download_name=download_name)
+
 @app.route('/reports/export/clients')
 @login_required
 def export_clients_report():
     """Exportar relatório de clientes"""
     try:
         report_type = request.args.get('type', 'excel')
-        clients = Client.get_all()
-        
-        report_generator = ReportGenerator()
-        
-        if report_type == 'excel':
-            filepath = report_generator.generate_client_report_excel(clients)
-            return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath))
-        
-        elif report_type == 'pdf':
-            filepath = report_generator.generate_client_report_pdf(clients)
-            return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath))
-        
-        else:
+        if report_type not in REPORT_FORMATS['clients']:
             flash('Tipo de relatório não suportado', 'danger')
             return redirect(url_for('reports'))
+        
+        return send_report('clients', report_type)
             
     except Exception as e:
         flash(f'Erro ao gerar relatório: {str(e)}', 'danger')
@@ -449,31 +586,11 @@ def export_sales_report():
     """Exportar relatório de vendas"""
     try:
         report_type = request.args.get('type', 'excel')
-        cards = KanbanCard.get_all()
-        
-        # Dados de performance mensal (mock para demonstração)
-        monthly_performance = [
-            {'month': 'Janeiro', 'sales': 15, 'revenue': 45000},
-            {'month': 'Fevereiro', 'sales': 18, 'revenue': 54000},
-            {'month': 'Março', 'sales': 22, 'revenue': 66000},
-            {'month': 'Abril', 'sales': 20, 'revenue': 60000},
-            {'month': 'Maio', 'sales': 25, 'revenue': 75000},
-            {'month': 'Junho', 'sales': 28, 'revenue': 84000}
-        ]
-        
-        report_generator = ReportGenerator()
-        
-        if report_type == 'excel':
-            filepath = report_generator.generate_sales_report_excel(cards)
-            return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath))
-        
-        elif report_type == 'pdf':
-            filepath = report_generator.generate_sales_report_pdf(cards, monthly_performance)
-            return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath))
-        
-        else:
+        if report_type not in REPORT_FORMATS['sales']:
             flash('Tipo de relatório não suportado', 'danger')
             return redirect(url_for('reports'))
+        
+        return send_report('sales', report_type)
             
     except Exception as e:
         flash(f'Erro ao gerar relatório: {str(e)}', 'danger')
@@ -484,25 +601,64 @@ def export_sales_report():
 def export_social_report():
     """Exportar relatório de redes sociais"""
     try:
-        meta_api = MetaBusinessAPI()
-        social_data = meta_api.get_unified_insights()
-        
-        report_generator = ReportGenerator()
-        filepath = report_generator.generate_social_media_report_pdf(social_data)
-        
-        return send_file(filepath, as_attachment=True, download_name=os.path.basename(filepath))
+        return send_report('social', 'pdf')
         
     except Exception as e:
         flash(f'Erro ao gerar relatório de redes sociais: {str(e)}', 'danger')
         return redirect(url_for('reports'))
 
+@app.route('/api/reports/jobs', methods=['POST'])
+@login_required
+def submit_report_job():
+    """Enfileirar a geração de um relatório; responde na hora com o ID do job"""
+    data = request.get_json(silent=True) or request.form
+    report_type = data.get('report_type')
+    file_format = data.get('format', 'pdf')
+    if file_format not in JOB_FORMATS.get(report_type, ()):
+        return jsonify({'error': 'Tipo de relatório não suportado'}), 400
+    
+    job = report_jobs.submit(report_type, file_format, requested_by=current_user.id)
+    return jsonify(dict(job.to_dict(), status_url=url_for('report_job_status', job_id=job.id))), 202
+
+def get_report_job(job_id):
+    """Job do usuário atual (administradores veem todos)"""
+    job = ReportJob.get(job_id)
+    if job is None or (job.requested_by != current_user.id and current_user.role != 'admin'):
+        return None
+    return job
+
+@app.route('/api/reports/jobs/<int:job_id>')
+@login_required
+def report_job_status(job_id):
+    """Status e progresso de um job de relatório"""
+    job = get_report_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Relatório não encontrado'}), 404
+    
+    payload = job.to_dict()
+    if job.status == 'done':
+        payload['download_url'] = url_for('download_report_job', job_id=job.id)
+    return jsonify(payload)
+
+@app.route('/reports/jobs/<int:job_id>/download')
+@login_required
+def download_report_job(job_id):
+    """Baixar o arquivo de um job concluído"""
+    job = get_report_job(job_id)
+    if job is None or job.status != 'done' or not os.path.exists(job.filepath):
+        flash('Relatório não encontrado ou expirado', 'warning')
+        return redirect(url_for('reports'))
+    
+    return send_file(job.filepath, as_attachment=True,
+                     download_name=report_filename(job.report_type, job.file_format, job.created_at))
+
 # API Routes for AJAX calls
 @app.route('/api/social/insights')
 @login_required
 def get_social_insights():
     """API para obter insights das redes sociais"""
     try:
-        meta_api = MetaBusinessAPI()
+        meta_api = get_meta_api()
         insights = meta_api.get_unified_insights()
         return jsonify(insights)
     except Exception as e:
@@ -513,7 +669,7 @@ def get_social_insights():
 def get_whatsapp_status():
     """API para verificar status da conexão WhatsApp"""
     try:
-        meta_api = MetaBusinessAPI()
+        meta_api = get_meta_api()
         accounts = meta_api.get_whatsapp_business_accounts()
         
         if accounts and 'data' in accounts:
@@ -529,21 +685,12 @@ def get_whatsapp_status():
 def refresh_dashboard():
     """Atualizar dados do dashboard"""
     try:
-        # Recalcular métricas
-        total_clients = len(Client.get_all())
-        total_cards = len(KanbanCard.get_all())
-        unread_messages = len([msg for msg in WhatsAppMessage.get_all() if not msg.read])
+        # Métricas materializadas: custo constante, independente do volume de dados
+        data = dashboard_metrics.snapshot()
         
         # Status das redes sociais
-        social_accounts = len(SocialAccount.get_all())
-        
-        data = {
-            'total_clients': total_clients,
-            'total_cards': total_cards,
-            'unread_messages': unread_messages,
-            'social_accounts': social_accounts,
-            'last_updated': datetime.now().strftime('%H:%M:%S')
-        }
+        data['social_accounts'] = SocialAccount.store.count()
+        data['last_updated'] = datetime.now().strftime('%H:%M:%S')
         
         return jsonify(data)
     except Exception as e:
@@ -0,0 +1,167 @@
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from models import Campaign, WhatsAppMessage
+from services.graph_scheduler import TokenBucket
+from services.whatsapp_queue import outbound_queue
+
+# Mensagens de campanha por segundo e limite do tier do número WhatsApp
+# (conversas iniciadas pela empresa em 24 horas: 1.000, 10.000, 100.000...)
+CAMPAIGN_RATE = float(os.environ.get('WHATSAPP_CAMPAIGN_RATE', 20))
+TIER_LIMIT = int(os.environ.get('WHATSAPP_TIER_LIMIT', 1000))
+TIER_WINDOW = 24 * 60 * 60
+# Intervalo máximo entre verificações de pausa enquanto o runner espera
+CHECK_INTERVAL = 5
+
+PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+
+def render_message(template, client):
+    """Personalizar o modelo; marcadores desconhecidos ficam como estão"""
+    values = {
+        'nome': client.name,
+        'primeiro_nome': client.name.split()[0] if client.name else '',
+        'email': client.email,
+        'tipo_seguro': client.insurance_type or '',
+    }
+    return PLACEHOLDER.sub(lambda match: values.get(match.group(1), match.group(0)), template)
+
+
+class TierWindow:
+    """Envios de campanha nas últimas 24h, contados a partir do store.
+
+    O total vem das próprias ``WhatsAppMessage`` de campanha, então o limite
+    vale para todos os processos e sobrevive a reinícios. A contagem é refeita
+    a cada ``CHECK_INTERVAL`` segundos (e sempre que o limite é atingido);
+    entre uma e outra os envios deste processo são somados localmente.
+    """
+
+    def __init__(self, limit=TIER_LIMIT, window=TIER_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.count = 0
+        self.counted_at = None
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Registrar um envio; retorna 0 ou quantos segundos esperar antes de tentar de novo"""
+        with self.lock:
+            now = time.monotonic()
+            if self.counted_at is None or now - self.counted_at >= CHECK_INTERVAL or self.count >= self.limit:
+                self.count = WhatsAppMessage.count_campaign_sends(datetime.now() - timedelta(seconds=self.window))
+                self.counted_at = now
+            if self.count >= self.limit:
+                return CHECK_INTERVAL
+            self.count += 1
+            return 0
+
+
+class CampaignRunner:
+    """Dispara campanhas em threads, no ritmo de ``CAMPAIGN_RATE`` e dentro do tier.
+
+    As mensagens vão para a ``outbound_queue``, que faz o envio e acompanha o
+    status de cada uma. O progresso da campanha é ``last_client_id``: cada
+    destinatário é reservado com compare-and-set antes de ser enfileirado, então
+    pausar, retomar (inclusive em outro processo) ou rodar dois runners nunca
+    repete nem pula clientes. Campanhas ``running`` interrompidas por um
+    reinício são retomadas por ``resume_pending``.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.bucket = TokenBucket(CAMPAIGN_RATE, max(1, int(CAMPAIGN_RATE)))
+        self.tier = TierWindow()
+
+    def init_app(self, app):
+        """Guardar a aplicação (contexto para as threads); não inicia nada"""
+        self.app = app
+
+    def resume_pending(self):
+        """Retomar as campanhas em andamento (uma vez por processo que atende requisições)"""
+        with self.app.app_context():
+            running = Campaign.get_by_status('running')
+        for campaign in running:
+            self._spawn(campaign.id)
+
+    def start(self, campaign):
+        """Calcular o tamanho do segmento, salvar a campanha e começar o disparo"""
+        campaign.total = sum(1 for client in campaign.get_segment() if client.phone)
+        Campaign.save(campaign)
+        self._spawn(campaign.id)
+        return campaign
+
+    def pause(self, campaign_id):
+        return Campaign.set_status(campaign_id, 'paused', expect='running')
+
+    def resume(self, campaign_id):
+        if not Campaign.set_status(campaign_id, 'running', expect='paused'):
+            return False
+        self._spawn(campaign_id)
+        return True
+
+    def progress(self, campaign_id):
+        campaign = Campaign.get(campaign_id)
+        if campaign is None:
+            return None
+        counts = WhatsAppMessage.count_by_campaign(campaign_id)
+        dispatched = sum(counts.values())
+        done = counts.get('sent', 0) + counts.get('delivered', 0) + counts.get('failed', 0)
+        return dict(campaign.to_dict(),
+                    dispatched=dispatched,
+                    queued=counts.get('queued', 0) + counts.get('sending', 0),
+                    sent=counts.get('sent', 0),
+                    delivered=counts.get('delivered', 0),
+                    failed=counts.get('failed', 0),
+                    percent=round(100 * done / campaign.total, 1) if campaign.total else 100.0)
+
+    def _spawn(self, campaign_id):
+        thread = threading.Thread(target=self._run, args=(campaign_id,), name=f'campaign-{campaign_id}', daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self, campaign_id):
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self.run(campaign_id)
+            else:
+                self.run(campaign_id)
+        except Exception as e:
+            print(f"Erro na campanha {campaign_id}: {e}")
+
+    def run(self, campaign_id):
+        """Enfileirar os destinatários restantes da campanha"""
+        campaign = Campaign.get(campaign_id)
+        last = campaign.last_client_id
+        for client in campaign.get_segment():
+            if client.id <= last or not client.phone:
+                continue
+            if not self._wait_turn(campaign_id):
+                return
+            if not Campaign.advance(campaign_id, last, client.id):
+                if not Campaign.is_running(campaign_id):
+                    return
+                last = Campaign.get(campaign_id).last_client_id  # outro runner avançou; segue a partir dele
+                continue
+            last = client.id
+            outbound_queue.enqueue(client.phone, render_message(campaign.template, client), sender=campaign.name,
+                                   client_id=client.id, campaign_id=campaign_id)
+        Campaign.set_status(campaign_id, 'completed', expect='running', finished_at=datetime.now())
+
+    def _wait_turn(self, campaign_id):
+        """Esperar vaga no ritmo e no tier; retorna False se a campanha deixou de rodar"""
+        wait = self.bucket.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        while True:
+            wait = self.tier.reserve()
+            if not wait:
+                return True
+            time.sleep(min(wait, CHECK_INTERVAL))
+            if not Campaign.is_running(campaign_id):
+                return False
+
+
+campaign_runner = CampaignRunner()
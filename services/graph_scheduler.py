@@ -0,0 +1,235 @@
+import os
+import json
+import random
+import threading
+import time
+
+# Taxas padrão (requisições/segundo) e rajada de cada escopo
+APP_RATE = float(os.environ.get('META_RATE_APP', 20))
+APP_BURST = int(os.environ.get('META_BURST_APP', 40))
+PAGE_RATE = float(os.environ.get('META_RATE_PAGE', 5))
+PAGE_BURST = int(os.environ.get('META_BURST_PAGE', 10))
+PHONE_RATE = float(os.environ.get('META_RATE_PHONE', 80))  # throughput padrão da WhatsApp Cloud API
+PHONE_BURST = int(os.environ.get('META_BURST_PHONE', 80))
+
+MAX_ATTEMPTS = int(os.environ.get('META_RETRY_ATTEMPTS', 4))
+BACKOFF_BASE = float(os.environ.get('META_RETRY_BACKOFF', 0.5))
+BACKOFF_MAX = float(os.environ.get('META_RETRY_BACKOFF_MAX', 30))
+MAX_WAIT = float(os.environ.get('META_RATE_MAX_WAIT', 10))
+# Prazo total de uma chamada (espera por fichas, tentativas e backoff), abaixo do timeout do gunicorn
+REQUEST_DEADLINE = float(os.environ.get('META_REQUEST_DEADLINE', 20))
+
+# Métodos que podem ser repetidos após timeout ou 5xx; os demais (POST) só são
+# repetidos quando a Meta comprovadamente não executou a chamada
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Códigos de erro da Graph API que indicam limite de uso ou falha temporária
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80001, 80002, 80003, 80004, 80005, 80006, 80008, 80009, 80014, 130429, 131048, 131056}
+TRANSIENT_ERROR_CODES = {1, 2}
+
+
+class RateLimitExceeded(Exception):
+    """Não foi possível obter permissão de envio dentro do tempo máximo de espera"""
+
+
+def connect_failed(error):
+    """A conexão nem chegou a ser aberta, então a requisição não chegou à Meta"""
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class TokenBucket:
+    """Balde de fichas com taxa ajustável e pausa forçada"""
+
+    def __init__(self, rate, capacity):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, count=1):
+        """Consumir fichas; retorna quantos segundos esperar antes de usá-las"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= count
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.paused_until - now)
+
+    def cancel(self, count=1):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + count)
+
+    def set_usage(self, percent):
+        """Reduzir a taxa conforme o uso informado pela Meta se aproxima de 100%"""
+        with self.lock:
+            if percent < 50:
+                self.rate = self.base_rate
+            else:
+                self.rate = self.base_rate * max(0.05, (100 - percent) / 50)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class GraphScheduler:
+    """Ponto único de saída para o tráfego da Graph API.
+
+    Cada requisição consome uma ficha do balde do app e dos escopos
+    informados (``page:<id>``, ``phone:<id>``). Os cabeçalhos de uso
+    (X-App-Usage, X-Page-Usage, X-Business-Use-Case-Usage) ajustam as taxas,
+    e erros temporários ou de limite são repetidos com backoff exponencial
+    com jitter. Requisições não idempotentes (envio de mensagem, publicação)
+    só são repetidas quando não chegaram a ser executadas: falha ao conectar,
+    HTTP 429 ou erro de limite da Graph API. Toda a chamada respeita um prazo
+    único (``REQUEST_DEADLINE``).
+    """
+
+    def __init__(self):
+        self.buckets = {'app': TokenBucket(APP_RATE, APP_BURST)}
+        self.lock = threading.Lock()
+
+    def bucket(self, scope):
+        if scope == 'app':
+            return self.buckets['app']
+        with self.lock:
+            if scope not in self.buckets:
+                if scope.startswith('phone:'):
+                    self.buckets[scope] = TokenBucket(PHONE_RATE, PHONE_BURST)
+                else:
+                    self.buckets[scope] = TokenBucket(PAGE_RATE, PAGE_BURST)
+            return self.buckets[scope]
+
+    def acquire(self, scopes, cost=1, deadline_at=None):
+        buckets = [self.bucket(scope) for scope in scopes]
+        waits = [bucket.reserve(cost) for bucket in buckets]
+        wait = max(waits)
+        max_wait = MAX_WAIT if deadline_at is None else min(MAX_WAIT, deadline_at - time.monotonic())
+        if wait > max_wait:
+            for bucket in buckets:
+                bucket.cancel(cost)
+            raise RateLimitExceeded(f"Limite de requisições atingido para {', '.join(scopes)}")
+        if wait > 0:
+            time.sleep(wait)
+
+    def request(self, session, method, url, scope=None, cost=1, idempotent=None, deadline=None, **kwargs):
+        """Enviar a requisição respeitando os limites; ``cost`` é o número de
+        chamadas que ela representa (itens de um batch).
+
+        ``idempotent`` (padrão: GET/HEAD/OPTIONS) libera novas tentativas após
+        timeout de leitura e erros 5xx; ``deadline`` limita o tempo total em
+        segundos, incluindo esperas e backoff.
+        """
+        import requests  # já carregado pela sessão; só para as exceções abaixo
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        deadline_at = time.monotonic() + (deadline or REQUEST_DEADLINE)
+        scopes = ['app'] + ([scope] if scope else [])
+        timeout = kwargs.pop('timeout', None)
+        for attempt in range(MAX_ATTEMPTS):
+            self.acquire(scopes, cost, deadline_at)
+            try:
+                response = session.request(method, url, timeout=self._timeout(timeout, deadline_at), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self.backoff(attempt)
+                if (attempt == MAX_ATTEMPTS - 1 or not (idempotent or connect_failed(e))
+                        or time.monotonic() + delay >= deadline_at):
+                    raise
+                time.sleep(delay)
+                continue
+            self.observe(response, scopes)
+            retry, delay = self.should_retry(response, attempt, idempotent)
+            if not retry or attempt == MAX_ATTEMPTS - 1 or time.monotonic() + delay >= deadline_at:
+                return response
+            time.sleep(delay)
+
+    def _timeout(self, timeout, deadline_at):
+        """Timeout da tentativa limitado ao que resta do prazo"""
+        remaining = max(deadline_at - time.monotonic(), 0.1)
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+    def backoff(self, attempt):
+        """Backoff exponencial com jitter total"""
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    def should_retry(self, response, attempt, idempotent=True):
+        status = response.status_code
+        if status < 400:
+            return False, 0
+        code = None
+        try:
+            code = response.json().get('error', {}).get('code')
+        except (ValueError, AttributeError):
+            pass
+        # Limite de uso: a Meta recusou sem executar, então repetir é seguro para qualquer método
+        throttled = status == 429 or code in THROTTLE_ERROR_CODES
+        transient = status >= 500 or code in TRANSIENT_ERROR_CODES
+        if throttled or (idempotent and transient):
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                return True, min(float(retry_after), BACKOFF_MAX)
+            return True, self.backoff(attempt)
+        return False, 0
+
+    def observe(self, response, scopes):
+        """Ajustar as taxas a partir dos cabeçalhos de uso da resposta.
+
+        Cada balde recebe o maior percentual entre todos os cabeçalhos e
+        entradas que o afetam, então uma entrada folgada não desfaz o recuo
+        pedido por outra.
+        """
+        headers = response.headers
+        percents = {}
+        regain = {}
+
+        def record(bucket, usage):
+            percents[bucket] = max(percents.get(bucket, 0), self._percent(usage))
+            regain[bucket] = max(regain.get(bucket, 0), usage.get('estimated_time_to_regain_access') or 0)
+
+        app_usage = self._parse(headers.get('X-App-Usage'))
+        if app_usage:
+            record(self.buckets['app'], app_usage)
+        page_usage = self._parse(headers.get('X-Page-Usage'))
+        business_usage = self._parse(headers.get('X-Business-Use-Case-Usage'))
+        scoped = [self.bucket(scope) for scope in scopes[1:]] or [self.buckets['app']]
+        usages = [page_usage] if page_usage else []
+        if business_usage:
+            for entries in business_usage.values():
+                usages.extend(entries)
+        for usage in usages:
+            for bucket in scoped:
+                record(bucket, usage)
+        for bucket, percent in percents.items():
+            bucket.set_usage(percent)
+            if regain[bucket]:
+                bucket.pause(regain[bucket] * 60)
+
+    def _parse(self, value):
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+
+    def _percent(self, usage):
+        return max(usage.get('call_count', 0), usage.get('total_cputime', 0), usage.get('total_time', 0))
+
+
+scheduler = GraphScheduler()
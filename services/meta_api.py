@@ -1,17 +1,248 @@
 import os
-import requests
+import functools
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from services.graph_scheduler import scheduler
 import json
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
+# Timeouts (conexão, leitura) em segundos — sem eles uma Graph API lenta prende o worker
+CONNECT_TIMEOUT = float(os.environ.get('META_API_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('META_API_READ_TIMEOUT', 15))
+POOL_SIZE = int(os.environ.get('META_API_POOL_SIZE', 20))
+# Chamadas simultâneas nas consultas em leque e prazo total de cada leque
+MAX_CONCURRENCY = int(os.environ.get('META_API_MAX_CONCURRENCY', 8))
+FAN_OUT_DEADLINE = float(os.environ.get('META_API_FAN_OUT_DEADLINE', 20))
+
+# Cache de respostas: TTL por endpoint (segundos), janela em que um valor vencido
+# ainda é servido enquanto é atualizado em segundo plano, e número máximo de entradas
+CACHE_TTLS = {
+    'accounts': int(os.environ.get('META_CACHE_TTL_ACCOUNTS', 900)),
+    'insights': int(os.environ.get('META_CACHE_TTL_INSIGHTS', 3600)),
+    'media': int(os.environ.get('META_CACHE_TTL_MEDIA', 300)),
+}
+CACHE_STALE_TTL = int(os.environ.get('META_CACHE_STALE_TTL', 86400))
+CACHE_MAX_ENTRIES = int(os.environ.get('META_CACHE_MAX_ENTRIES', 512))
+CACHE_ERROR_TTL = int(os.environ.get('META_CACHE_ERROR_TTL', 60))
+# Limite de requisições por chamada batch da Graph API
+BATCH_LIMIT = 50
+
+_session = None
+_session_lock = threading.Lock()
+_shared_api = None
+_executor = None
+
+
+def get_session():
+    """Sessão HTTP compartilhada pelo processo (keep-alive e pool de conexões)"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests é carregado na primeira chamada à Graph API, não no boot do worker
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def get_executor():
+    """Pool de threads limitado usado para disparar chamadas independentes em paralelo"""
+    global _executor
+    if _executor is None:
+        with _session_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix='meta-api')
+    return _executor
+
+
+def fan_out(calls, deadline=None):
+    """Executar chamadas independentes em paralelo.
+
+    ``calls`` mapeia um nome para (função, *args). Retorna nome -> resultado;
+    chamadas que falham ou estouram o prazo ficam com None, de modo que o
+    chamador recebe resultados parciais em vez de perder tudo.
+    """
+    executor = get_executor()
+    deadline_at = time.monotonic() + (deadline or FAN_OUT_DEADLINE)
+    futures = {name: executor.submit(fn, *args) for name, (fn, *args) in calls.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline_at - time.monotonic(), 0))
+        except FutureTimeoutError:
+            print(f"Prazo esgotado na chamada Meta API: {name}")
+            future.cancel()
+            results[name] = None
+        except Exception as e:
+            print(f"Erro na chamada Meta API {name}: {e}")
+            results[name] = None
+    return results
+
+
+class ResponseCache:
+    """Cache LRU com TTL e stale-while-revalidate para respostas da Graph API.
+
+    Valores dentro do TTL são servidos direto. Vencidos, mas dentro da janela
+    ``stale_ttl``, são servidos imediatamente enquanto uma única atualização
+    roda no pool de threads. Falhas (None) nunca substituem um valor em cache;
+    sem valor anterior, a falha é lembrada por ``CACHE_ERROR_TTL`` segundos para
+    não repetir a chamada a cada acesso.
+    """
+    
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, stale_ttl=CACHE_STALE_TTL):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.entries = OrderedDict()  # chave -> (valor, obtido em)
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = None  # pool próprio: atualizações não disputam threads com fan_out
+    
+    def get_or_fetch(self, key, ttl, fetch):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                value, fetched_at = entry
+                age = now - fetched_at
+                if value is None:
+                    if age < CACHE_ERROR_TTL:
+                        return None
+                elif age < ttl:
+                    return value
+                elif age < ttl + self.stale_ttl:
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        if self.executor is None:
+                            self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='meta-cache')
+                        self.executor.submit(self._refresh, key, fetch)
+                    return value
+        value = fetch()
+        self._store(key, value)
+        return value
+    
+    def _refresh(self, key, fetch):
+        try:
+            self._store(key, fetch())
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+    
+    def _store(self, key, value):
+        with self.lock:
+            if value is None and self.entries.get(key, (None,))[0] is not None:
+                return
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def invalidate(self, endpoint=None):
+        """Descartar as entradas de um endpoint (ou todas)"""
+        with self.lock:
+            if endpoint is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == endpoint]:
+                    del self.entries[key]
+
+
+response_cache = ResponseCache()
+
+
+def cached(endpoint):
+    """Cachear o método por endpoint e parâmetros da chamada"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (endpoint, self.base_url, method.__name__, args, tuple(sorted(kwargs.items())))
+            return response_cache.get_or_fetch(key, CACHE_TTLS[endpoint], lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def get_meta_api():
+    """Instância de MetaBusinessAPI compartilhada pelo processo"""
+    global _shared_api
+    if _shared_api is None:
+        _shared_api = MetaBusinessAPI()
+    return _shared_api
+
+
 class MetaBusinessAPI:
     """Integração com Meta Business API para WhatsApp, Instagram e Facebook"""
     
-    def __init__(self):
+    def __init__(self, base_url=None, session=None):
         self.access_token = os.environ.get('META_API_TOKEN')
-        self.base_url = "https://graph.facebook.com/v18.0"
+        self.base_url = base_url or os.environ.get('META_API_BASE_URL', "https://graph.facebook.com/v18.0")
         self.whatsapp_phone_id = None  # Will be set based on business account
+        self.session = session or get_session()
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    
+    def _get(self, url, headers=None, params=None, scope=None):
+        return scheduler.request(self.session, 'GET', url, scope=scope, headers=headers or self.get_headers(),
+                                 params=params, timeout=self.timeout)
+    
+    def _post(self, url, headers=None, json=None, scope=None, idempotent=False):
+        return scheduler.request(self.session, 'POST', url, scope=scope, headers=headers or self.get_headers(),
+                                 json=json, timeout=self.timeout, idempotent=idempotent)
         
+    def batch_get(self, items):
+        """Executar vários GETs em requisições batch da Graph API.
+
+        ``items`` é uma lista de (caminho, params) ou (caminho, params,
+        access_token) — o token por item permite usar tokens de página.
+        Os itens são divididos em lotes de ``BATCH_LIMIT`` enviados em
+        paralelo. Retorna os corpos na mesma ordem, com None nos itens que
+        falharam.
+        """
+        chunks = [items[i:i + BATCH_LIMIT] for i in range(0, len(items), BATCH_LIMIT)]
+        results = fan_out({index: (self._send_batch, chunk) for index, chunk in enumerate(chunks)})
+        bodies = []
+        for index, chunk in enumerate(chunks):
+            bodies.extend(results[index] or [None] * len(chunk))
+        return bodies
+    
+    def _send_batch(self, chunk):
+        batch = []
+        for path, params, *token in chunk:
+            params = dict(params or {})
+            if token and token[0]:
+                params['access_token'] = token[0]
+            relative_url = path.lstrip('/') + ('?' + urlencode(params) if params else '')
+            batch.append({'method': 'GET', 'relative_url': relative_url})
+        try:
+            response = scheduler.request(
+                self.session, 'POST', f"{self.base_url}/", cost=len(batch), idempotent=True,  # batch só de GETs
+                headers={'Authorization': f'Bearer {self.access_token}'},
+                data={'batch': json.dumps(batch), 'include_headers': 'false'},
+                timeout=self.timeout
+            )
+            if response.status_code != 200:
+                print(f"Erro na requisição batch: HTTP {response.status_code}")
+                return None
+            bodies = []
+            for (path, *_), item in zip(chunk, response.json()):
+                if item is None or item.get('code') != 200:
+                    # Item nulo: a Graph API não concluiu a requisição dentro do batch
+                    print(f"Erro no item do batch {path}: {item.get('body') if item else 'sem resposta'}")
+                    bodies.append(None)
+                else:
+                    bodies.append(json.loads(item['body']))
+            return bodies
+        except Exception as e:
+            print(f"Erro ao executar requisição batch: {e}")
+            return None
+    
     def get_headers(self):
         return {
             'Authorization': f'Bearer {self.access_token}',
@@ -19,11 +250,12 @@ class MetaBusinessAPI:
         }
     
     # WhatsApp Business API Methods
+    @cached('accounts')
     def get_whatsapp_business_accounts(self):
         """Obter contas do WhatsApp Business"""
         try:
             url = f"{self.base_url}/me/businesses"
-            response = requests.get(url, headers=self.get_headers())
+            response = self._get(url)
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter contas WhatsApp Business: {e}")
@@ -46,7 +278,7 @@ class MetaBusinessAPI:
                 "text": {"body": message}
             }
             
-            response = requests.post(url, headers=self.get_headers(), json=payload)
+            response = self._post(url, json=payload, scope=f"phone:{self.whatsapp_phone_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao enviar mensagem WhatsApp: {e}")
@@ -57,7 +289,7 @@ class MetaBusinessAPI:
         try:
             url = f"{self.base_url}/{self.whatsapp_phone_id}/messages"
             params = {"limit": limit}
-            response = requests.get(url, headers=self.get_headers(), params=params)
+            response = self._get(url, params=params, scope=f"phone:{self.whatsapp_phone_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter mensagens WhatsApp: {e}")
@@ -72,24 +304,27 @@ class MetaBusinessAPI:
                 "status": "read",
                 "message_id": message_id
             }
-            response = requests.post(url, headers=self.get_headers(), json=payload)
+            # Marcar como lida pode ser repetido sem efeito colateral
+            response = self._post(url, json=payload, scope=f"phone:{self.whatsapp_phone_id}", idempotent=True)
             return response.status_code == 200
         except Exception as e:
             print(f"Erro ao marcar mensagem como lida: {e}")
             return False
     
     # Instagram Business API Methods
+    @cached('accounts')
     def get_instagram_accounts(self):
         """Obter contas conectadas do Instagram"""
         try:
             url = f"{self.base_url}/me/accounts"
             params = {"fields": "instagram_business_account"}
-            response = requests.get(url, headers=self.get_headers(), params=params)
+            response = self._get(url, params=params)
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter contas Instagram: {e}")
             return None
     
+    @cached('media')
     def get_instagram_media(self, instagram_account_id: str, limit: int = 25):
         """Obter mídia do Instagram"""
         try:
@@ -98,12 +333,13 @@ class MetaBusinessAPI:
                 "fields": "id,caption,media_type,media_url,thumbnail_url,timestamp,like_count,comments_count",
                 "limit": limit
             }
-            response = requests.get(url, headers=self.get_headers(), params=params)
+            response = self._get(url, params=params, scope=f"page:{instagram_account_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter mídia Instagram: {e}")
             return None
     
+    @cached('insights')
     def get_instagram_insights(self, instagram_account_id: str, period: str = "day"):
         """Obter insights do Instagram"""
         try:
@@ -112,7 +348,7 @@ class MetaBusinessAPI:
                 "metric": "impressions,reach,profile_views,website_clicks",
                 "period": period
             }
-            response = requests.get(url, headers=self.get_headers(), params=params)
+            response = self._get(url, params=params, scope=f"page:{instagram_account_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter insights Instagram: {e}")
@@ -127,7 +363,7 @@ class MetaBusinessAPI:
                 "image_url": image_url,
                 "caption": caption
             }
-            response = requests.post(url, headers=self.get_headers(), json=payload)
+            response = self._post(url, json=payload, scope=f"page:{instagram_account_id}")
             
             if response.status_code == 200:
                 creation_id = response.json().get('id')
@@ -135,7 +371,7 @@ class MetaBusinessAPI:
                 # Depois, publicar a mídia
                 publish_url = f"{self.base_url}/{instagram_account_id}/media_publish"
                 publish_payload = {"creation_id": creation_id}
-                publish_response = requests.post(publish_url, headers=self.get_headers(), json=publish_payload)
+                publish_response = self._post(publish_url, json=publish_payload, scope=f"page:{instagram_account_id}")
                 
                 return publish_response.json() if publish_response.status_code == 200 else None
             return None
@@ -144,17 +380,19 @@ class MetaBusinessAPI:
             return None
     
     # Facebook Pages API Methods
+    @cached('accounts')
     def get_facebook_pages(self):
         """Obter páginas do Facebook"""
         try:
             url = f"{self.base_url}/me/accounts"
             params = {"fields": "id,name,access_token,category,fan_count"}
-            response = requests.get(url, headers=self.get_headers(), params=params)
+            response = self._get(url, params=params)
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter páginas Facebook: {e}")
             return None
     
+    @cached('insights')
     def get_facebook_page_insights(self, page_id: str, page_access_token: str):
         """Obter insights da página do Facebook"""
         try:
@@ -166,7 +404,7 @@ class MetaBusinessAPI:
             params = {
                 "metric": "page_impressions,page_engaged_users,page_post_engagements,page_fans"
             }
-            response = requests.get(url, headers=headers, params=params)
+            response = self._get(url, headers=headers, params=params, scope=f"page:{page_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter insights Facebook: {e}")
@@ -184,7 +422,7 @@ class MetaBusinessAPI:
             if link:
                 payload["link"] = link
                 
-            response = requests.post(url, headers=headers, json=payload)
+            response = self._post(url, headers=headers, json=payload, scope=f"page:{page_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao criar post Facebook: {e}")
@@ -199,44 +437,124 @@ class MetaBusinessAPI:
                 'Content-Type': 'application/json'
             }
             params = {"fields": "participants,updated_time,message_count"}
-            response = requests.get(url, headers=headers, params=params)
+            response = self._get(url, headers=headers, params=params, scope=f"page:{page_id}")
             return response.json() if response.status_code == 200 else None
         except Exception as e:
             print(f"Erro ao obter mensagens Facebook: {e}")
             return None
     
+    # Listagens paginadas (sincronização incremental)
+    def iter_pages(self, url, params=None, headers=None, scope=None):
+        """Percorrer uma listagem seguindo ``paging.next``, gerando um item por vez.
+
+        As páginas só são pedidas quando o consumidor chega nelas; quem para de
+        iterar (ex.: ao alcançar a marca d'água) não baixa o resto. Erros HTTP
+        levantam exceção em vez de encerrar a listagem pela metade, para que a
+        marca d'água não avance sobre itens que não foram lidos.
+        """
+        while url:
+            response = self._get(url, headers=headers, params=params, scope=scope)
+            response.raise_for_status()
+            body = response.json()
+            yield from body.get('data', [])
+            url = body.get('paging', {}).get('next')
+            params = None  # a URL de ``next`` já traz os parâmetros e o cursor
+    
+    def iter_whatsapp_messages(self, limit: int = 100):
+        """Mensagens do WhatsApp, das mais recentes para as mais antigas, em todas as páginas"""
+        url = f"{self.base_url}/{self.whatsapp_phone_id}/messages"
+        return self.iter_pages(url, {"limit": limit}, scope=f"phone:{self.whatsapp_phone_id}")
+    
+    def iter_facebook_messages(self, page_id: str, page_access_token: str, limit: int = 100):
+        """Conversas da página, das atualizadas mais recentemente para as mais antigas"""
+        url = f"{self.base_url}/{page_id}/conversations"
+        headers = {
+            'Authorization': f'Bearer {page_access_token}',
+            'Content-Type': 'application/json'
+        }
+        params = {"fields": "participants,updated_time,message_count", "limit": limit}
+        return self.iter_pages(url, params, headers=headers, scope=f"page:{page_id}")
+    
+    def iter_instagram_media(self, instagram_account_id: str, limit: int = 100):
+        """Mídia do Instagram, da mais recente para a mais antiga"""
+        url = f"{self.base_url}/{instagram_account_id}/media"
+        params = {
+            "fields": "id,caption,media_type,media_url,thumbnail_url,timestamp,like_count,comments_count",
+            "limit": limit
+        }
+        return self.iter_pages(url, params, scope=f"page:{instagram_account_id}")
+    
+    @cached('insights')
+    def get_bulk_insights(self, instagram_account_ids: tuple, pages: tuple, period: str = "day"):
+        """Obter insights de várias contas Instagram e páginas Facebook em requisições batch.
+
+        ``pages`` é uma tupla de (page_id, page_access_token). Retorna
+        {'instagram': {id: insights}, 'facebook': {page_id: insights}}.
+        """
+        items = [(f"{ig_id}/insights", {"metric": "impressions,reach,profile_views,website_clicks", "period": period})
+                 for ig_id in instagram_account_ids]
+        items += [(f"{page_id}/insights", {"metric": "page_impressions,page_engaged_users,page_post_engagements,page_fans"}, token)
+                  for page_id, token in pages]
+        bodies = self.batch_get(items)
+        n_ig = len(instagram_account_ids)
+        return {
+            'instagram': dict(zip(instagram_account_ids, bodies[:n_ig])),
+            'facebook': dict(zip((page_id for page_id, _ in pages), bodies[n_ig:]))
+        }
+    
+    @cached('media')
+    def get_bulk_instagram_media(self, instagram_account_ids: tuple, limit: int = 25):
+        """Obter mídia de várias contas Instagram em requisições batch"""
+        fields = "id,caption,media_type,media_url,thumbnail_url,timestamp,like_count,comments_count"
+        bodies = self.batch_get([(f"{ig_id}/media", {"fields": fields, "limit": limit}) for ig_id in instagram_account_ids])
+        return dict(zip(instagram_account_ids, bodies))
+    
     # Unified Social Media Management
     def get_all_social_accounts(self):
         """Obter todas as contas de redes sociais conectadas"""
-        accounts = {
-            'whatsapp': self.get_whatsapp_business_accounts(),
-            'instagram': self.get_instagram_accounts(),
-            'facebook': self.get_facebook_pages()
-        }
-        return accounts
+        return fan_out({
+            'whatsapp': (self.get_whatsapp_business_accounts,),
+            'instagram': (self.get_instagram_accounts,),
+            'facebook': (self.get_facebook_pages,)
+        })
     
     def get_unified_insights(self):
         """Obter insights unificados de todas as plataformas"""
         insights = {}
         
-        # Instagram insights
-        instagram_accounts = self.get_instagram_accounts()
+        # Contas do Instagram e páginas do Facebook em paralelo
+        accounts = fan_out({
+            'instagram': (self.get_instagram_accounts,),
+            'facebook': (self.get_facebook_pages,)
+        })
+        instagram_accounts = accounts['instagram']
+        facebook_pages = accounts['facebook']
+        
+        # Insights de todas as contas/páginas em requisições batch
+        ig_ids = []
         if instagram_accounts and 'data' in instagram_accounts:
             for account in instagram_accounts['data']:
                 if 'instagram_business_account' in account:
-                    ig_id = account['instagram_business_account']['id']
-                    insights['instagram'] = self.get_instagram_insights(ig_id)
+                    ig_ids.append(account['instagram_business_account']['id'])
+        pages = facebook_pages['data'] if facebook_pages and 'data' in facebook_pages else []
+        results = {'instagram': {}, 'facebook': {}}
+        if ig_ids or pages:
+            results = self.get_bulk_insights(
+                tuple(ig_ids), tuple((page['id'], page['access_token']) for page in pages)
+            ) or results
+        
+        # Instagram insights
+        if ig_ids:
+            insights['instagram'] = results['instagram'].get(ig_ids[-1])
         
         # Facebook insights
-        facebook_pages = self.get_facebook_pages()
         if facebook_pages and 'data' in facebook_pages:
             insights['facebook'] = []
-            for page in facebook_pages['data']:
-                page_insights = self.get_facebook_page_insights(page['id'], page['access_token'])
+            for page in pages:
                 insights['facebook'].append({
                     'page_id': page['id'],
                     'page_name': page['name'],
-                    'insights': page_insights
+                    'insights': results['facebook'].get(page['id'])
                 })
         
-        return insights
\ No newline at end of file
+        return insights
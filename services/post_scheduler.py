@@ -0,0 +1,216 @@
+import heapq
+import os
+import socket
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models import Lease, SocialAccount, SocialPost
+from services.meta_api import get_meta_api
+
+# Publicações simultâneas, intervalo para enxergar posts criados por outros
+# processos e novas tentativas quando a Graph API falha
+PUBLISH_CONCURRENCY = int(os.environ.get('POST_PUBLISH_CONCURRENCY', 4))
+REFRESH_INTERVAL = float(os.environ.get('POST_SCHEDULER_REFRESH', 15))
+PUBLISH_MAX_ATTEMPTS = int(os.environ.get('POST_PUBLISH_MAX_ATTEMPTS', 3))
+PUBLISH_RETRY_DELAY = int(os.environ.get('POST_PUBLISH_RETRY_DELAY', 60))
+# Só um processo publica por vez: o dono da liderança renova a cada REFRESH_INTERVAL
+# (tem de ser menor que o prazo) e os demais tentam assumir a cada LEADER_RETRY
+LEADER_KEY = 'post-scheduler'
+LEADER_TTL = float(os.environ.get('POST_SCHEDULER_LEADER_TTL', 60))
+LEADER_RETRY = float(os.environ.get('POST_SCHEDULER_LEADER_RETRY', 20))
+
+
+def publish_post(post, meta_api=None):
+    """Publicar o post na conta de origem; retorna a resposta da Graph API ou None"""
+    meta_api = meta_api or get_meta_api()
+    account = SocialAccount.store.get(int(post.account_id))
+    if account is None:
+        print(f"Conta {post.account_id} do post {post.id} não encontrada")
+        return None
+    if post.platform == 'facebook':
+        return meta_api.create_facebook_post(account.account_id, account.access_token, post.content)
+    if post.platform == 'instagram' and post.media_url:
+        return meta_api.create_instagram_post(account.account_id, post.media_url, post.content)
+    print(f"Post {post.id} não pode ser publicado em {post.platform} (Instagram exige imagem)")
+    return None
+
+
+class PostScheduler:
+    """Publica posts agendados no horário, a partir de um min-heap (horário, id).
+
+    O loop dorme até o próximo vencimento (ou até ``schedule`` avisar de um post
+    mais cedo), então nunca percorre a lista de posts. Posts criados por outros
+    processos entram pela leitura incremental por ID a cada ``REFRESH_INTERVAL``.
+    Cada post é reservado com compare-and-set em ``published`` antes de ir para
+    a Graph API, então dois publicadores não publicam o mesmo post.
+
+    Todo worker web chama ``start``, mas só o dono da ``Lease`` ``post-scheduler``
+    roda o loop; os outros esperam e assumem se o dono morrer e o prazo vencer.
+    """
+
+    def __init__(self, concurrency=PUBLISH_CONCURRENCY):
+        self.app = None
+        self.heap = []
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='post-publisher')
+        self.attempts = {}
+        self.last_id = 0
+        self.running = False
+        self.thread = None
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+
+    def init_app(self, app):
+        self.app = app
+
+    def schedule(self, post):
+        """Avisar de um post recém-agendado; só tem efeito no processo que roda o loop"""
+        if self.running:
+            self._push(post)
+
+    def _push(self, post):
+        """Colocar um post no heap e acordar o loop se ele vencer antes do próximo"""
+        if post.published or not post.scheduled_time:
+            return
+        with self.condition:
+            heapq.heappush(self.heap, (post.scheduled_time, post.id))
+            self.last_id = max(self.last_id, post.id)
+            self.condition.notify()
+
+    def load_pending(self):
+        """Carga inicial: posts não publicados (índice em ``published``)"""
+        for post in SocialPost.store.filter(published=False):
+            self._push(post)
+        last = SocialPost.store.page('id', 1, reverse=True)[0]
+        if last:
+            self.last_id = max(self.last_id, last[0].id)
+
+    def load_new(self):
+        """Posts criados desde a última leitura (por outros processos)"""
+        while True:
+            posts = SocialPost.get_created_after(self.last_id)
+            if not posts:
+                return
+            for post in posts:
+                self._push(post)
+            self.last_id = max(self.last_id, posts[-1].id)
+
+    def start(self):
+        """Disputar a liderança e, como dono, rodar o loop em uma thread deste processo"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run_as_leader, name='post-scheduler', daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def run_as_leader(self):
+        while True:
+            try:
+                if self._lead():
+                    self.run_forever()
+            except Exception as e:
+                self._step_down()
+                print(f"Erro no publicador de posts agendados: {e}")
+            time.sleep(LEADER_RETRY)
+
+    def _lead(self):
+        """Assumir ou renovar a liderança; retorna True se este processo é o dono"""
+        with self._context():
+            return Lease.acquire(LEADER_KEY, self.holder, LEADER_TTL)
+
+    def run_forever(self):
+        """Publicar enquanto for o dono da liderança; retorna quando a perde"""
+        self.running = True
+        with self._context():
+            self.load_pending()
+        next_refresh = time.monotonic() + REFRESH_INTERVAL
+        while True:
+            due = self._wait_for_due(next_refresh)
+            for scheduled_time, post_id in due:
+                self.executor.submit(self._publish, post_id)
+            if time.monotonic() >= next_refresh:
+                if not self._lead():
+                    self._step_down()
+                    return
+                with self._context():
+                    self.load_new()
+                next_refresh = time.monotonic() + REFRESH_INTERVAL
+
+    def _step_down(self):
+        """Outro processo assumiu: esquecer o heap; publicações em andamento terminam (o CAS evita duplicar)"""
+        with self.condition:
+            self.running = False
+            self.heap = []
+            self.attempts = {}
+            self.last_id = 0
+
+    def _wait_for_due(self, next_refresh):
+        """Dormir até o próximo vencimento ou atualização; retorna as entradas vencidas"""
+        with self.condition:
+            while True:
+                now = datetime.now()
+                if self.heap and self.heap[0][0] <= now:
+                    due = []
+                    while self.heap and self.heap[0][0] <= now:
+                        due.append(heapq.heappop(self.heap))
+                    return due
+                timeout = next_refresh - time.monotonic()
+                if self.heap:
+                    timeout = min(timeout, (self.heap[0][0] - now).total_seconds())
+                if timeout <= 0:
+                    return []
+                self.condition.wait(timeout)
+
+    def _publish(self, post_id):
+        try:
+            with self._context():
+                self.publish(post_id)
+        except Exception as e:
+            print(f"Erro ao publicar post agendado {post_id}: {e}")
+
+    def publish(self, post_id):
+        post = SocialPost.get(post_id)
+        if post is None or post.published or not post.scheduled_time:
+            return
+        if post.scheduled_time > datetime.now():
+            self._push(post)  # reagendado para mais tarde
+            return
+        # A reserva já grava o horário de publicação: no caso comum (sucesso) é a única escrita
+        if SocialPost.store.update(post_id, expect={'published': False}, published=True,
+                                   published_at=datetime.now()) is None:
+            return  # já reservado por outro publicador
+        if publish_post(post):
+            self.attempts.pop(post_id, None)
+            return
+        SocialPost.store.update(post_id, published=False, published_at=None)
+        attempts = self.attempts.get(post_id, 0) + 1
+        if attempts < PUBLISH_MAX_ATTEMPTS:
+            self.attempts[post_id] = attempts
+            retry_at = datetime.now() + timedelta(seconds=PUBLISH_RETRY_DELAY * attempts)
+            with self.condition:
+                heapq.heappush(self.heap, (retry_at, post_id))
+                self.condition.notify()
+        else:
+            self.attempts.pop(post_id, None)
+            print(f"Post {post_id} não publicado após {attempts} tentativas")
+
+    def _context(self):
+        return self.app.app_context() if self.app is not None else nullcontext()
+
+
+post_scheduler = PostScheduler()
+
+
+if __name__ == '__main__':
+    # Processo dedicado opcional: python -m services.post_scheduler. Disputa a mesma
+    # liderança dos workers web, então pode rodar ao lado deles. Não importa o app web,
+    # que iniciaria a fila de envio do WhatsApp, as campanhas e o pool de relatórios.
+    if not os.environ.get('DATABASE_URL'):
+        print('DATABASE_URL não definido: sem banco compartilhado o publicador roda dentro do app web')
+        raise SystemExit(0)
+    from flask import Flask
+    from database import init_database
+    app = Flask(__name__)
+    init_database(app)
+    post_scheduler.init_app(app)
+    post_scheduler.run_as_leader()
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+from operator import attrgetter
+
+# Diretório e espaço máximo em disco dos relatórios em cache
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', os.path.join('reports', 'cache'))
+REPORT_CACHE_MAX_MB = float(os.environ.get('REPORT_CACHE_MAX_MB', 200))
+# Mudou o layout dos relatórios? Incrementar para não servir arquivos no formato antigo
+LAYOUT_VERSION = 1
+
+EXTENSIONS = {'excel': 'xlsx', 'pdf': 'pdf', 'zip': 'zip'}
+
+
+def data_version(records=(), fields=(), extra=None):
+    """Hash do conteúdo que vai para o relatório.
+
+    ``records`` entram como tuplas de ``fields`` (só os campos exibidos) e
+    ``extra`` como JSON. Independe do backend e do processo: o mesmo dado
+    gera a mesma versão em qualquer worker.
+    """
+    digest = hashlib.sha256(str(LAYOUT_VERSION).encode())
+    if fields:
+        getter = attrgetter(*fields)
+        batch = []
+        for record in records:
+            batch.append(repr(getter(record)))
+            if len(batch) >= 1000:
+                digest.update('\n'.join(batch).encode())
+                batch = []
+        digest.update('\n'.join(batch).encode())
+    if extra is not None:
+        digest.update(json.dumps(extra, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:32]
+
+
+class ReportCache:
+    """Relatórios prontos em disco, por (tipo, formato, versão dos dados).
+
+    A data de modificação do arquivo é a do último uso: ``get`` a atualiza e,
+    quando o diretório passa de ``max_bytes``, os menos usados são apagados
+    primeiro (LRU). Como o estado fica todo no disco, vale para todos os
+    workers que compartilham ``reports/``.
+    """
+
+    def __init__(self, directory=REPORT_CACHE_DIR, max_bytes=int(REPORT_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def path_for(self, report_type, file_format, version):
+        return os.path.join(self.directory, f"{report_type}_{file_format}_{version}.{EXTENSIONS[file_format]}")
+
+    def get(self, report_type, file_format, version):
+        """Caminho do relatório em cache (marcando o uso) ou None"""
+        path = self.path_for(report_type, file_format, version)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put_file(self, report_type, file_format, version, filepath):
+        """Mover um relatório recém-gerado para o cache; retorna o novo caminho"""
+        path = self.path_for(report_type, file_format, version)
+        os.makedirs(self.directory, exist_ok=True)
+        os.replace(filepath, path)
+        self.evict()
+        return path
+
+    def put_bytes(self, report_type, file_format, version, data):
+        """Gravar o conteúdo de um relatório gerado em memória; retorna o caminho"""
+        path = self.path_for(report_type, file_format, version)
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Apagar os arquivos menos usados até caber em ``max_bytes``"""
+        with self.lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                try:
+                    if entry.is_file() and not entry.name.endswith('.tmp'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    continue
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    print(f"Erro ao remover relatório do cache {path}: {e}")
+
+
+report_cache = ReportCache()
@@ -1,40 +1,110 @@
 import os
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
+from copy import copy
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.chart import BarChart, LineChart, Reference
-from reportlab.lib.pagesizes import A4, letter
+from openpyxl.utils import get_column_letter
+from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, LongTable, TableStyle, Flowable
 from reportlab.lib import colors
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.charts.lineplots import LinePlot
-from reportlab.graphics.charts.barcharts import VerticalBarChart
-from io import BytesIO
+from functools import partial
 import base64
 
+PIPELINE_COLUMNS = ('atendimento_inicial', 'proposta_enviada', 'venda_andamento', 'venda_concluida', 'pos_venda')
+
+# Tabela de clientes do PDF: larguras e alturas fixas (as mesmas que o reportlab
+# calcularia para este estilo), então nenhuma célula precisa ser medida, e a
+# tabela vai em blocos de ~1 página, que quebram sem recalcular as linhas restantes
+CLIENT_TABLE_COL_WIDTHS = [2*inch, 2.5*inch, 1.5*inch, 1.5*inch, 1*inch]
+CLIENT_TABLE_HEADER_HEIGHT = 27
+CLIENT_TABLE_ROW_HEIGHT = 18
+CLIENT_TABLE_CHUNK_ROWS = 40
+CLIENT_TABLE_BODY_STYLE = [
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+]
+CLIENT_TABLE_HEADER_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+]
+
+class LazyTable(Flowable):
+    """Bloco de tabela montado só quando o reportlab chega nele e descartado depois de desenhado.
+
+    O ``LongTable`` guarda um estilo por célula; montar todos os blocos antes do
+    ``doc.build`` ocupava ~2 KB por linha durante toda a geração.
+    """
+
+    def __init__(self, factory):
+        Flowable.__init__(self)
+        self.factory = factory
+        self.table = None
+
+    def _table(self):
+        if self.table is None:
+            self.table = self.factory()
+        return self.table
+
+    def wrap(self, availWidth, availHeight):
+        self.width, self.height = self._table().wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        return self._table().split(availWidth, availHeight)
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._table().drawOn(canvas, x, y, _sW)
+        self.table = None
+
 class ReportGenerator:
     """Gerador de relatórios em Excel e PDF"""
     
-    def __init__(self):
-        self.styles = getSampleStyleSheet()
-        self.setup_custom_styles()
+    _styles = None
+    _styles_lock = threading.Lock()
+    
+    def __init__(self, progress=None):
+        self.styles = self.shared_styles()
+        self.progress = progress  # callback(percentual), usado pelos jobs de relatório
+    
+    @classmethod
+    def shared_styles(cls):
+        """Folha de estilos do PDF, montada uma vez por processo (só é lida pelos relatórios)"""
+        if cls._styles is None:
+            with cls._styles_lock:
+                if cls._styles is None:
+                    styles = getSampleStyleSheet()
+                    cls.setup_custom_styles(styles)
+                    cls._styles = styles
+        return cls._styles
     
-    def setup_custom_styles(self):
+    @staticmethod
+    def setup_custom_styles(styles):
         """Configurar estilos personalizados para PDF"""
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='CustomTitle',
-            parent=self.styles['Heading1'],
+            parent=styles['Heading1'],
             fontSize=24,
             spaceAfter=30,
             textColor=colors.HexColor('#0d6efd'),
             alignment=1  # Center
         ))
         
-        self.styles.add(ParagraphStyle(
+        styles.add(ParagraphStyle(
             name='SectionHeader',
-            parent=self.styles['Heading2'],
+            parent=styles['Heading2'],
             fontSize=16,
             spaceAfter=12,
             textColor=colors.HexColor('#198754'),
@@ -48,91 +118,58 @@ class ReportGenerator:
         if not filename:
             filename = f"relatorio_clientes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Relatório de Clientes"
-        
-        # Cabeçalho
-        headers = ['ID', 'Nome', 'Email', 'Telefone', 'CPF/CNPJ', 'Tipo de Seguro', 'Endereço', 'Data Cadastro', 'Status']
-        ws.append(headers)
-        
-        # Estilizar cabeçalho
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="0D6EFD", end_color="0D6EFD", fill_type="solid")
-        
-        for col in range(1, len(headers) + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Dados dos clientes
-        for client in clients:
-            ws.append([
-                client.id,
-                client.name,
-                client.email,
-                client.phone,
-                client.cpf_cnpj,
-                client.insurance_type or '-',
-                client.address or '-',
-                client.created_at.strftime('%d/%m/%Y'),
-                client.status
-            ])
-        
-        # Ajustar largura das colunas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Adicionar bordas
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        for row in ws.iter_rows(min_row=1, max_row=len(clients) + 1, min_col=1, max_col=len(headers)):
-            for cell in row:
-                cell.border = thin_border
-        
         # Salvar arquivo
         filepath = f"reports/{filename}"
         os.makedirs("reports", exist_ok=True)
-        wb.save(filepath)
+        with open(filepath, 'wb') as output:
+            self.write_client_report_excel(clients, output)
         return filepath
     
-    def generate_sales_report_excel(self, cards, filename=None):
+    def write_client_report_excel(self, clients, output):
+        """Escrever o relatório de clientes em ``output`` (arquivo ou buffer)"""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Relatório de Clientes")
+        
+        headers = ['ID', 'Nome', 'Email', 'Telefone', 'CPF/CNPJ', 'Tipo de Seguro', 'Endereço', 'Data Cadastro', 'Status']
+        rows = ((
+            client.id,
+            client.name,
+            client.email,
+            client.phone,
+            client.cpf_cnpj,
+            client.insurance_type or '-',
+            client.address or '-',
+            client.created_at.strftime('%d/%m/%Y'),
+            client.status
+        ) for client in self._tracked(clients, 0, 50))
+        self._write_excel_table(ws, headers, rows, borders=True)
+        
+        wb.save(output)
+    
+    def generate_sales_report_excel(self, cards, filename=None, pipeline_stats=None):
         """Gerar relatório de vendas em Excel"""
         if not filename:
             filename = f"relatorio_vendas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         
-        wb = Workbook()
-        
-        # Aba principal - Resumo
-        ws_summary = wb.active
-        ws_summary.title = "Resumo Vendas"
+        # Salvar arquivo
+        filepath = f"reports/{filename}"
+        os.makedirs("reports", exist_ok=True)
+        with open(filepath, 'wb') as output:
+            self.write_sales_report_excel(cards, output, pipeline_stats=pipeline_stats)
+        return filepath
+    
+    def write_sales_report_excel(self, cards, output, pipeline_stats=None):
+        """Escrever o relatório de vendas em ``output`` (arquivo ou buffer)"""
+        wb = Workbook(write_only=True)
         
         # Calcular estatísticas
         total_cards = len(cards)
-        pipeline_stats = {}
-        columns = ['atendimento_inicial', 'proposta_enviada', 'venda_andamento', 'venda_concluida', 'pos_venda']
-        
-        for column in columns:
-            pipeline_stats[column] = len([c for c in cards if c.column == column])
+        if pipeline_stats is None:
+            pipeline_stats = self._count_pipeline(cards)
         
-        # Criar resumo
+        # Aba principal - Resumo
+        ws_summary = wb.create_sheet("Resumo Vendas")
         summary_data = [
-            ['Métrica', 'Valor'],
             ['Total de Operações', total_cards],
             ['Atendimento Inicial', pipeline_stats['atendimento_inicial']],
             ['Propostas Enviadas', pipeline_stats['proposta_enviada']],
@@ -141,69 +178,111 @@ class ReportGenerator:
             ['Pós-venda', pipeline_stats['pos_venda']],
             ['Taxa de Conversão (%)', round((pipeline_stats['venda_concluida'] / max(total_cards, 1)) * 100, 2)]
         ]
-        
-        for row in summary_data:
-            ws_summary.append(row)
-        
-        # Estilizar resumo
-        self._style_excel_sheet(ws_summary, summary_data)
+        self._write_excel_table(ws_summary, ['Métrica', 'Valor'], summary_data, tracked=False)
         
         # Aba detalhada - Todas as operações
         ws_details = wb.create_sheet("Detalhes Operações")
         detail_headers = ['ID', 'Título', 'Descrição', 'Cliente ID', 'Responsável', 'Coluna', 'Prioridade', 'Criado em', 'Atualizado em']
-        ws_details.append(detail_headers)
-        
-        for card in cards:
-            ws_details.append([
-                card.id,
-                card.title,
-                card.description,
-                card.client_id or '-',
-                card.assigned_to or '-',
-                card.column.replace('_', ' ').title(),
-                card.priority,
-                card.created_at.strftime('%d/%m/%Y %H:%M'),
-                card.updated_at.strftime('%d/%m/%Y %H:%M')
-            ])
-        
-        self._style_excel_sheet(ws_details, None, detail_headers)
+        rows = ((
+            card.id,
+            card.title,
+            card.description,
+            card.client_id or '-',
+            card.assigned_to or '-',
+            card.column.replace('_', ' ').title(),
+            card.priority,
+            card.created_at.strftime('%d/%m/%Y %H:%M'),
+            card.updated_at.strftime('%d/%m/%Y %H:%M')
+        ) for card in self._tracked(cards, 0, 50))
+        self._write_excel_table(ws_details, detail_headers, rows)
         
         # Adicionar gráficos
         self._add_excel_charts(wb, pipeline_stats)
         
-        # Salvar arquivo
-        filepath = f"reports/{filename}"
-        os.makedirs("reports", exist_ok=True)
-        wb.save(filepath)
-        return filepath
+        wb.save(output)
     
-    def _style_excel_sheet(self, worksheet, data=None, headers=None):
-        """Aplicar estilos ao worksheet Excel"""
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="0D6EFD", end_color="0D6EFD", fill_type="solid")
-        
-        # Estilizar primeira linha (cabeçalho)
-        for col in range(1, worksheet.max_column + 1):
-            cell = worksheet.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Ajustar largura das colunas
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+    def _count_pipeline(self, cards):
+        """Contar cartões por etapa em uma única passada"""
+        pipeline_stats = dict.fromkeys(PIPELINE_COLUMNS, 0)
+        for card in cards:
+            if card.column in pipeline_stats:
+                pipeline_stats[card.column] += 1
+        return pipeline_stats
+    
+    def _write_excel_table(self, worksheet, headers, rows, borders=False, tracked=True):
+        """Escrever cabeçalho e linhas em uma planilha write-only.
+        
+        O openpyxl grava as larguras antes da primeira linha, então elas são
+        calculadas na mesma passada que monta as linhas; depois as linhas vão
+        direto para o arquivo, sem reler célula por célula.
+        """
+        widths = [len(str(header)) for header in headers]
+        table = []
+        for row in rows:
+            for index, value in enumerate(row):
+                length = len(str(value))
+                if length > widths[index]:
+                    widths[index] = length
+            table.append(row)
+        for index, width in enumerate(widths, 1):
+            worksheet.column_dimensions[get_column_letter(index)].width = min(width + 2, 50)
+        
+        header_cell = WriteOnlyCell(worksheet)
+        header_cell.font = Font(bold=True, color="FFFFFF")
+        header_cell.fill = PatternFill(start_color="0D6EFD", end_color="0D6EFD", fill_type="solid")
+        header_cell.alignment = Alignment(horizontal="center")
+        if borders:
+            thin_border = Border(
+                left=Side(style='thin'),
+                right=Side(style='thin'),
+                top=Side(style='thin'),
+                bottom=Side(style='thin')
+            )
+            header_cell.border = thin_border
+            body_cell = WriteOnlyCell(worksheet)
+            body_cell.border = thin_border
+        worksheet.append([self._styled_cell(worksheet, header, header_cell) for header in headers])
+        
+        for row in (self._tracked(table, 50, 95) if tracked else table):
+            if borders:
+                row = [self._styled_cell(worksheet, value, body_cell) for value in row]
+            worksheet.append(row)
+    
+    def _tracked(self, records, start, end):
+        """Iterar ``records`` informando o avanço de ``start`` a ``end`` (%)"""
+        if self.progress is None:
+            yield from records
+            return
+        total = max(len(records), 1)
+        step = max(total // 100, 1)
+        for index, record in enumerate(records):
+            if index % step == 0:
+                self.progress(start + (end - start) * index // total)
+            yield record
+    
+    def _build_pdf(self, doc, story, start=50):
+        """Construir o PDF informando o avanço por flowable (de ``start`` a 95%)"""
+        if self.progress is not None:
+            total = max(len(story), 1)
+            
+            def on_progress(kind, value):
+                if kind == 'PROGRESS':
+                    self.progress(start + (95 - start) * value // total)
+            
+            doc.setProgressCallBack(on_progress)
+        doc.build(story)
+    
+    def _styled_cell(self, worksheet, value, template):
+        """Célula com o estilo já registrado de ``template`` (evita registrar o estilo a cada célula)"""
+        cell = WriteOnlyCell(worksheet, value)
+        cell._style = copy(template._style)
+        return cell
     
     def _add_excel_charts(self, workbook, pipeline_stats):
         """Adicionar gráficos ao Excel"""
+        # Só o relatório de vendas usa gráficos; o módulo é carregado aqui
+        from openpyxl.chart import BarChart, Reference
+        
         ws_charts = workbook.create_sheet("Gráficos")
         
         # Dados para gráfico
@@ -259,58 +338,56 @@ class ReportGenerator:
         summary_title = Paragraph("Resumo Executivo", self.styles['SectionHeader'])
         story.append(summary_title)
         
-        total_clients = len(clients)
-        types_count = {}
-        for client in clients:
-            if client.insurance_type:
-                types_count[client.insurance_type] = types_count.get(client.insurance_type, 0) + 1
-        
-        summary_text = f"""
-        Total de clientes cadastrados: {total_clients}<br/>
-        Tipos de seguro mais procurados: {', '.join([f"{k}: {v}" for k, v in sorted(types_count.items(), key=lambda x: x[1], reverse=True)[:3]])}<br/>
-        Data de cadastro mais recente: {max([c.created_at for c in clients]).strftime('%d/%m/%Y') if clients else 'N/A'}
-        """
-        
-        story.append(Paragraph(summary_text, self.styles['Normal']))
-        story.append(Spacer(1, 20))
+        # O resumo entra aqui depois: as estatísticas saem da mesma passada que monta a tabela
+        summary_index = len(story)
         
         # Tabela de clientes
         clients_title = Paragraph("Lista Detalhada de Clientes", self.styles['SectionHeader'])
         story.append(clients_title)
         
-        # Preparar dados da tabela
-        table_data = [['Nome', 'Email', 'Telefone', 'Tipo Seguro', 'Data Cadastro']]
-        
-        for client in clients:
-            table_data.append([
+        # Preparar dados da tabela em blocos; só o primeiro leva o cabeçalho
+        types_count = {}
+        latest = None
+        header = ['Nome', 'Email', 'Telefone', 'Tipo Seguro', 'Data Cadastro']
+        chunk = [header]
+        for client in self._tracked(clients, 0, 50):
+            if client.insurance_type:
+                types_count[client.insurance_type] = types_count.get(client.insurance_type, 0) + 1
+            if latest is None or client.created_at > latest:
+                latest = client.created_at
+            chunk.append([
                 client.name[:25] + '...' if len(client.name) > 25 else client.name,
                 client.email[:30] + '...' if len(client.email) > 30 else client.email,
                 client.phone,
                 client.insurance_type or '-',
                 client.created_at.strftime('%d/%m/%Y')
             ])
+            if len(chunk) >= CLIENT_TABLE_CHUNK_ROWS:
+                story.append(LazyTable(partial(self._client_table, chunk, chunk[0] is header)))
+                chunk = []
+        if chunk:
+            story.append(LazyTable(partial(self._client_table, chunk, chunk[0] is header)))
         
-        # Criar tabela
-        table = Table(table_data, colWidths=[2*inch, 2.5*inch, 1.5*inch, 1.5*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0d6efd')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ]))
-        
-        story.append(table)
+        summary_text = f"""
+        Total de clientes cadastrados: {len(clients)}<br/>
+        Tipos de seguro mais procurados: {', '.join([f"{k}: {v}" for k, v in sorted(types_count.items(), key=lambda x: x[1], reverse=True)[:3]])}<br/>
+        Data de cadastro mais recente: {latest.strftime('%d/%m/%Y') if latest else 'N/A'}
+        """
+        story[summary_index:summary_index] = [Paragraph(summary_text, self.styles['Normal']), Spacer(1, 20)]
         
         # Construir PDF
-        doc.build(story)
+        self._build_pdf(doc, story)
         return filepath
     
-    def generate_sales_report_pdf(self, cards, monthly_data=None, filename=None):
+    def _client_table(self, rows, with_header):
+        """Bloco da tabela de clientes com larguras e alturas já definidas"""
+        row_heights = [CLIENT_TABLE_ROW_HEIGHT] * len(rows)
+        if with_header:
+            row_heights[0] = CLIENT_TABLE_HEADER_HEIGHT
+        return LongTable(rows, colWidths=CLIENT_TABLE_COL_WIDTHS, rowHeights=row_heights,
+                         style=CLIENT_TABLE_HEADER_STYLE if with_header else CLIENT_TABLE_BODY_STYLE)
+    
+    def generate_sales_report_pdf(self, cards, monthly_data=None, filename=None, pipeline_stats=None):
         """Gerar relatório de vendas em PDF"""
         if not filename:
             filename = f"relatorio_vendas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
@@ -336,11 +413,9 @@ class ReportGenerator:
         story.append(metrics_title)
         
         total_cards = len(cards)
-        pipeline_stats = {}
-        columns = ['atendimento_inicial', 'proposta_enviada', 'venda_andamento', 'venda_concluida', 'pos_venda']
-        
-        for column in columns:
-            pipeline_stats[column] = len([c for c in cards if c.column == column])
+        if pipeline_stats is None:
+            pipeline_stats = self._count_pipeline(cards)
+        columns = PIPELINE_COLUMNS
         
         conversion_rate = (pipeline_stats['venda_concluida'] / max(total_cards, 1)) * 100
         
@@ -410,7 +485,7 @@ class ReportGenerator:
             story.append(monthly_table)
         
         # Construir PDF
-        doc.build(story)
+        self._build_pdf(doc, story)
         return filepath
     
     def generate_social_media_report_pdf(self, social_data, filename=None):
@@ -460,7 +535,7 @@ class ReportGenerator:
         story.append(Paragraph(whatsapp_text, self.styles['Normal']))
         
         # Construir PDF
-        doc.build(story)
+        self._build_pdf(doc, story)
         return filepath
     
     def get_report_as_base64(self, filepath):
@@ -0,0 +1,325 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import namedtuple
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models import Client, KanbanCard, ReportJob
+from services.meta_api import get_meta_api
+from services.report_cache import report_cache, data_version, EXTENSIONS
+
+# Relatórios gerados em paralelo por processo, por quanto tempo os arquivos de
+# reports/ ficam disponíveis e de quanto em quanto tempo a limpeza roda (segundos)
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+REPORT_RETENTION_HOURS = float(os.environ.get('REPORT_RETENTION_HOURS', 24))
+REPORT_CLEANUP_INTERVAL = float(os.environ.get('REPORT_CLEANUP_INTERVAL', 600))
+# Segundos sem sinal de vida para um job 'running' ser considerado abandonado (worker reciclado)
+REPORT_JOB_LEASE = float(os.environ.get('REPORT_JOB_LEASE', 300))
+REPORTS_DIR = 'reports'
+# Processos usados pelo pacote com todos os relatórios (um por núcleo, por padrão)
+BUNDLE_WORKERS = int(os.environ.get('REPORT_BUNDLE_WORKERS', os.cpu_count() or 1))
+# Nada de fork direto do worker gunicorn: com threads rodando, o filho pode herdar um lock
+# preso e travar. Com forkserver os processos partem de um servidor de uma thread só, que já
+# carregou reportlab/openpyxl; sem ele (Windows, macOS antigos), spawn
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    BUNDLE_CONTEXT = multiprocessing.get_context('forkserver')
+    BUNDLE_CONTEXT.set_forkserver_preload(['services.report_generator'])
+else:
+    BUNDLE_CONTEXT = multiprocessing.get_context('spawn')
+
+# Formatos disponíveis e prefixo do arquivo por relatório
+REPORT_FORMATS = {
+    'clients': ('excel', 'pdf'),
+    'sales': ('excel', 'pdf'),
+    'social': ('pdf',),
+}
+REPORT_PREFIXES = {
+    'clients': 'relatorio_clientes',
+    'sales': 'relatorio_vendas',
+    'social': 'relatorio_redes_sociais',
+    'bundle': 'relatorios',
+}
+# Jobs aceitos: cada relatório nos seus formatos e o pacote com todos eles em ZIP
+JOB_FORMATS = dict(REPORT_FORMATS, bundle=('zip',))
+
+# Dados de performance mensal (mock para demonstração)
+MONTHLY_PERFORMANCE = [
+    {'month': 'Janeiro', 'sales': 15, 'revenue': 45000},
+    {'month': 'Fevereiro', 'sales': 18, 'revenue': 54000},
+    {'month': 'Março', 'sales': 22, 'revenue': 66000},
+    {'month': 'Abril', 'sales': 20, 'revenue': 60000},
+    {'month': 'Maio', 'sales': 25, 'revenue': 75000},
+    {'month': 'Junho', 'sales': 28, 'revenue': 84000}
+]
+
+
+# Campos de cada registro que aparecem nos relatórios (entram na versão dos dados)
+CLIENT_FIELDS = ('id', 'name', 'email', 'phone', 'cpf_cnpj', 'insurance_type', 'address', 'created_at', 'status')
+CARD_FIELDS = ('id', 'title', 'description', 'client_id', 'assigned_to', 'column', 'priority', 'created_at',
+               'updated_at')
+# Linhas só com esses campos, enviadas aos processos do pacote
+ClientRow = namedtuple('ClientRow', CLIENT_FIELDS)
+CardRow = namedtuple('CardRow', CARD_FIELDS)
+
+
+def load_report_data(report_type):
+    """Dados de entrada do relatório"""
+    if report_type == 'clients':
+        return {'clients': Client.get_all()}
+    if report_type == 'sales':
+        return {'cards': KanbanCard.get_all(), 'pipeline_stats': KanbanCard.count_by_column()}
+    return {'social_data': get_meta_api().get_unified_insights()}
+
+
+def plain_report_data(report_type, data):
+    """Cópia dos dados só com tipos básicos, para enviar a outro processo.
+
+    Com ``DATABASE_URL`` os registros são instâncias mapeadas pelo SQLAlchemy,
+    que os processos do pacote (sem o mapeamento) não conseguem desserializar.
+    """
+    if report_type == 'clients':
+        return {'clients': [ClientRow(*(getattr(client, field) for field in CLIENT_FIELDS))
+                            for client in data['clients']]}
+    if report_type == 'sales':
+        return dict(data, cards=[CardRow(*(getattr(card, field) for field in CARD_FIELDS)) for card in data['cards']])
+    return data
+
+
+def report_version(report_type, data):
+    """Versão (hash do conteúdo) dos dados de um relatório; chave do cache"""
+    if report_type == 'clients':
+        return data_version(data['clients'], CLIENT_FIELDS)
+    if report_type == 'sales':
+        return data_version(data['cards'], CARD_FIELDS, extra=[data['pipeline_stats'], MONTHLY_PERFORMANCE])
+    return data_version(extra=data['social_data'])
+
+
+def generate_report(report_type, file_format, data, filename=None, progress=None):
+    """Gerar o relatório em ``reports/``; retorna o caminho do arquivo"""
+    # Nome único: jobs, exportações e pacotes simultâneos não escrevem no mesmo arquivo
+    filename = filename or f"{REPORT_PREFIXES[report_type]}_{uuid.uuid4().hex}.{EXTENSIONS[file_format]}"
+    # reportlab/openpyxl são carregados no primeiro relatório, não no boot do worker
+    from services.report_generator import ReportGenerator
+    report_generator = ReportGenerator(progress=progress)
+    if report_type == 'clients':
+        if file_format == 'excel':
+            return report_generator.generate_client_report_excel(data['clients'], filename)
+        return report_generator.generate_client_report_pdf(data['clients'], filename)
+    if report_type == 'sales':
+        if file_format == 'excel':
+            return report_generator.generate_sales_report_excel(data['cards'], filename,
+                                                                pipeline_stats=data['pipeline_stats'])
+        return report_generator.generate_sales_report_pdf(data['cards'], MONTHLY_PERFORMANCE, filename,
+                                                          pipeline_stats=data['pipeline_stats'])
+    return report_generator.generate_social_media_report_pdf(data['social_data'], filename)
+
+
+def write_report_excel(report_type, data, output):
+    """Escrever a planilha do relatório em ``output`` (arquivo ou buffer)"""
+    from services.report_generator import ReportGenerator
+    report_generator = ReportGenerator()
+    if report_type == 'clients':
+        report_generator.write_client_report_excel(data['clients'], output)
+    else:
+        report_generator.write_sales_report_excel(data['cards'], output, pipeline_stats=data['pipeline_stats'])
+
+
+def build_report(report_type, file_format, progress=None):
+    """Reaproveitar o relatório do cache se os dados não mudaram, senão gerá-lo.
+
+    Retorna o caminho do arquivo (dentro do cache).
+    """
+    data = load_report_data(report_type)
+    version = report_version(report_type, data)
+    cached = report_cache.get(report_type, file_format, version)
+    if cached:
+        return cached
+    filepath = generate_report(report_type, file_format, data, progress=progress)
+    return report_cache.put_file(report_type, file_format, version, filepath)
+
+
+def build_bundle(output, workers=BUNDLE_WORKERS, progress=None):
+    """Gravar em ``output`` (caminho ou arquivo) um ZIP com todos os relatórios em todos os formatos.
+
+    Os dados são carregados uma vez aqui; os relatórios que não estão no cache
+    são gerados ao mesmo tempo em processos separados (reportlab e openpyxl
+    são CPU-bound e não paralelizam em threads) e depois guardados no cache.
+    ``progress`` recebe o percentual a cada relatório concluído.
+    """
+    data = {report_type: load_report_data(report_type) for report_type in REPORT_FORMATS}
+    files, missing = {}, []
+    for report_type, formats in REPORT_FORMATS.items():
+        version = report_version(report_type, data[report_type])
+        for file_format in formats:
+            cached = report_cache.get(report_type, file_format, version)
+            if cached:
+                files[(report_type, file_format)] = cached
+            else:
+                missing.append((report_type, file_format, version))
+    
+    if missing:
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(missing))), mp_context=BUNDLE_CONTEXT) as pool:
+            plain = {report_type: plain_report_data(report_type, data[report_type])
+                     for report_type in {report_type for report_type, _, _ in missing}}
+            futures = [(pool.submit(generate_report, report_type, file_format, plain[report_type]),
+                        report_type, file_format, version) for report_type, file_format, version in missing]
+            for done, (future, report_type, file_format, version) in enumerate(futures, 1):
+                files[(report_type, file_format)] = report_cache.put_file(report_type, file_format, version,
+                                                                          future.result())
+                if progress:
+                    progress(done * 100 // (len(missing) + 1))
+    
+    moment = datetime.now()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for (report_type, file_format), filepath in files.items():
+            bundle.write(filepath, report_filename(report_type, file_format, moment))
+    return output
+
+
+def build_bundle_file(progress=None):
+    """Gerar o pacote em ``reports/``; retorna o caminho do ZIP"""
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    filepath = os.path.join(REPORTS_DIR, f"{REPORT_PREFIXES['bundle']}_{uuid.uuid4().hex}.zip")
+    return build_bundle(filepath, progress=progress)
+
+
+def report_filename(report_type, file_format, moment=None):
+    """Nome do arquivo oferecido no download"""
+    moment = moment or datetime.now()
+    return f"{REPORT_PREFIXES[report_type]}_{moment.strftime('%Y%m%d_%H%M%S')}.{EXTENSIONS[file_format]}"
+
+
+def cleanup_reports(retention_hours=REPORT_RETENTION_HOURS, directory=REPORTS_DIR):
+    """Apagar arquivos de ``reports/`` e jobs finalizados mais antigos que a retenção.
+
+    Vale também para arquivos gerados fora dos jobs. Retorna quantos arquivos apagou.
+    """
+    cutoff = datetime.now() - timedelta(hours=retention_hours)
+    removed = 0
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            try:
+                if entry.is_file() and datetime.fromtimestamp(entry.stat().st_mtime) < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError as e:
+                print(f"Erro ao remover relatório antigo {entry.path}: {e}")
+    for status in ('done', 'failed'):
+        for job in ReportJob.get_by_status(status):
+            if job.finished_at and job.finished_at < cutoff:
+                ReportJob.delete(job.id)
+    return removed
+
+
+class ReportJobQueue:
+    """Gera relatórios (e o pacote ZIP, ``bundle``) em um pool de threads, fora da requisição.
+
+    ``submit`` grava o ``ReportJob`` (status ``queued``) e devolve na hora; a
+    requisição não espera o reportlab/openpyxl. Com ``DATABASE_URL`` o job fica
+    visível para todos os workers gunicorn, que servem status e download a
+    partir do registro e do arquivo em ``reports/``. O job é reservado com
+    compare-and-set (queued -> running), então jobs pendentes retomados por
+    vários processos após um reinício são gerados uma única vez. Enquanto
+    gera, o worker atualiza ``heartbeat_at`` junto com o progresso; jobs
+    ``running`` sem sinal há mais de ``REPORT_JOB_LEASE`` (worker reciclado no
+    meio da geração) voltam para a fila no boot e a cada limpeza.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS):
+        self.app = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-worker')
+        self.lock = threading.Lock()
+        self.last_cleanup = 0.0
+
+    def init_app(self, app):
+        """Guardar a aplicação (contexto para os workers); não inicia nada"""
+        self.app = app
+
+    def resume_pending(self):
+        """Retomar jobs pendentes e agendar a limpeza (uma vez por processo que atende requisições)"""
+        with self._context():
+            self.recover_stale()
+            pending = ReportJob.get_by_status('queued')
+        for job in pending:
+            self.executor.submit(self._run, job.id)
+        self._schedule_cleanup()
+
+    def recover_stale(self, lease=REPORT_JOB_LEASE):
+        """Devolver para a fila os jobs abandonados em 'running'; retorna seus IDs"""
+        expired = datetime.now() - timedelta(seconds=lease)
+        recovered = []
+        for job in ReportJob.get_by_status('running'):
+            if job.heartbeat_at is not None and job.heartbeat_at >= expired:
+                continue
+            # compare-and-set no sinal de vida: o job pode ter avançado ou sido recuperado por outro processo
+            if ReportJob.store.update(job.id, expect={'status': 'running', 'heartbeat_at': job.heartbeat_at},
+                                      status='queued', progress=0, heartbeat_at=None) is not None:
+                recovered.append(job.id)
+        return recovered
+
+    def submit(self, report_type, file_format, requested_by=None):
+        """Registrar o job e colocá-lo no pool; retorna o ``ReportJob``"""
+        job = ReportJob(report_type, file_format, requested_by)
+        ReportJob.save(job)
+        self.executor.submit(self._run, job.id)
+        self._schedule_cleanup()
+        return job
+
+    def _schedule_cleanup(self):
+        """Rodar a limpeza no pool, no máximo uma vez por ``REPORT_CLEANUP_INTERVAL``"""
+        with self.lock:
+            now = time.monotonic()
+            if self.last_cleanup and now - self.last_cleanup < REPORT_CLEANUP_INTERVAL:
+                return
+            self.last_cleanup = now
+        self.executor.submit(self._cleanup)
+
+    def _cleanup(self):
+        try:
+            with self._context():
+                cleanup_reports()
+                recovered = self.recover_stale()
+            for job_id in recovered:
+                self.executor.submit(self._run, job_id)
+        except Exception as e:
+            print(f"Erro na limpeza de relatórios: {e}")
+
+    def _run(self, job_id):
+        try:
+            with self._context():
+                self.run(job_id)
+        except Exception as e:
+            print(f"Erro no job de relatório {job_id}: {e}")
+
+    def run(self, job_id):
+        if not ReportJob.set_status(job_id, 'running', expect='queued', heartbeat_at=datetime.now()):
+            return  # já reservado por outro processo
+        job = ReportJob.get(job_id)
+        reported = [0]
+
+        def progress(percent):
+            # Só grava quando o percentual avança, para não escrever no banco a cada linha
+            if percent > reported[0]:
+                reported[0] = percent
+                ReportJob.store.update(job_id, progress=percent, heartbeat_at=datetime.now())
+
+        try:
+            if job.report_type == 'bundle':
+                filepath = build_bundle_file(progress)
+            else:
+                filepath = build_report(job.report_type, job.file_format, progress)
+        except Exception as e:
+            ReportJob.set_status(job_id, 'failed', expect='running', error=str(e), finished_at=datetime.now())
+            return
+        ReportJob.set_status(job_id, 'done', expect='running', progress=100, filepath=filepath,
+                             finished_at=datetime.now())
+
+    def _context(self):
+        return self.app.app_context() if self.app is not None else nullcontext()
+
+
+report_jobs = ReportJobQueue()
@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+from models import SyncState, SocialAccount, SocialPost
+from services.webhooks import whatsapp_event, ingest
+
+
+def unix_stamp(value):
+    """Timestamp unix (WhatsApp) -> datetime UTC sem fuso"""
+    return datetime.fromtimestamp(int(value or 0), timezone.utc).replace(tzinfo=None)
+
+
+def graph_stamp(value):
+    """Data ISO da Graph API ("2024-05-01T12:00:00+0000") -> datetime UTC sem fuso"""
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def take_new(key, items, stamp):
+    """Consumir ``items`` (mais recentes primeiro) até a marca d'água de ``key``.
+
+    Para no primeiro item mais antigo que a marca, então só as páginas com
+    novidades são baixadas. Retorna os itens novos e a nova marca, que só deve
+    ser gravada com ``save_watermark`` depois que os itens forem armazenados;
+    se a importação falhar no meio, a próxima sincronização os busca de novo.
+    """
+    state = SyncState.get_or_create(key)
+    seen = set(state.seen_ids or [])
+    new_items = []
+    for item in items:
+        moment = stamp(item)
+        if state.watermark is not None:
+            if moment < state.watermark:
+                break
+            if moment == state.watermark and item.get('id') in seen:
+                continue
+        new_items.append((moment, item))
+    watermark = None
+    if new_items:
+        latest = max(moment for moment, _ in new_items)
+        latest_ids = [item.get('id') for moment, item in new_items if moment == latest]
+        if latest == state.watermark:
+            latest_ids += list(seen)
+        watermark = (latest, latest_ids)
+    return [item for _, item in new_items], watermark
+
+
+def save_watermark(key, watermark):
+    """Avançar a marca d'água de ``key`` para o valor devolvido por ``take_new``"""
+    state = SyncState.get_or_create(key)
+    if watermark is not None:
+        state.watermark, state.seen_ids = watermark
+    SyncState.save(state)
+
+
+def sync_whatsapp_messages(meta_api):
+    """Importar mensagens do WhatsApp recebidas desde a última sincronização"""
+    key = f"whatsapp:{meta_api.whatsapp_phone_id}"
+    messages, watermark = take_new(key, meta_api.iter_whatsapp_messages(),
+                                   lambda message: unix_stamp(message.get('timestamp')))
+    received, _ = ingest([whatsapp_event(message) for message in messages])
+    save_watermark(key, watermark)
+    return received
+
+
+def sync_facebook_conversations(meta_api, account):
+    """Conversas da página atualizadas desde a última sincronização"""
+    key = f"facebook:{account.account_id}"
+    conversations, watermark = take_new(key, meta_api.iter_facebook_messages(account.account_id, account.access_token),
+                                        lambda conversation: graph_stamp(conversation['updated_time']))
+    save_watermark(key, watermark)
+    SocialAccount.store.update(account.id, last_sync=datetime.now())
+    return conversations
+
+
+def sync_instagram_media(meta_api, account):
+    """Importar como posts publicados as mídias novas da conta Instagram"""
+    key = f"instagram:{account.account_id}"
+    media, watermark = take_new(key, meta_api.iter_instagram_media(account.account_id),
+                                lambda item: graph_stamp(item['timestamp']))
+    for item in media:
+        post = SocialPost(
+            account_id=str(account.id),
+            content=item.get('caption', ''),
+            platform='instagram',
+            post_type='video' if item.get('media_type') == 'VIDEO' else 'image'
+        )
+        post.published = True
+        post.published_at = graph_stamp(item['timestamp'])
+        post.metrics.update(likes=item.get('like_count', 0), comments=item.get('comments_count', 0))
+        SocialPost.save(post)
+    save_watermark(key, watermark)
+    SocialAccount.store.update(account.id, last_sync=datetime.now())
+    return media
@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import os
+import threading
+from datetime import datetime
+from models import Client, WhatsAppMessage
+
+# Segredo do app Meta (assina o corpo dos webhooks) e token da verificação de assinatura
+APP_SECRET = os.environ.get('META_APP_SECRET')
+VERIFY_TOKEN = os.environ.get('META_WEBHOOK_VERIFY_TOKEN')
+
+# Status de entrega da Cloud API -> status da mensagem enviada
+DELIVERY_STATUSES = {'delivered': 'delivered', 'read': 'delivered', 'failed': 'failed'}
+
+_ingest_lock = threading.Lock()
+
+
+def verify_signature(payload, signature, secret=None):
+    """Conferir o cabeçalho X-Hub-Signature-256 (HMAC-SHA256 do corpo bruto)"""
+    secret = secret or APP_SECRET
+    if not secret or not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len('sha256='):])
+
+
+def whatsapp_event(message, contacts=None):
+    """Converter uma mensagem da Cloud API no formato aceito por ``ingest``"""
+    names = {contact.get('wa_id'): contact.get('profile', {}).get('name') for contact in contacts or []}
+    message_type = message.get('type', 'text')
+    if message_type == 'text':
+        text = message.get('text', {}).get('body', '')
+    else:
+        text = message.get(message_type, {}).get('caption') or f"[{message_type}]"
+    phone = message.get('from', '')
+    return {
+        'id': message.get('id'),
+        'phone': phone,
+        'sender': names.get(phone) or phone,
+        'text': text,
+        'timestamp': int(message.get('timestamp') or 0),
+    }
+
+
+def messenger_event(messaging):
+    """Mensagem do Messenger (entry.messaging); o remetente é um PSID, sem telefone"""
+    message = messaging.get('message', {})
+    sender_id = messaging.get('sender', {}).get('id', '')
+    return {
+        'id': message.get('mid'),
+        'phone': None,
+        'sender': f"Messenger {sender_id}",
+        'text': message.get('text') or '[anexo]',
+        'timestamp': int(messaging.get('timestamp') or 0) // 1000,
+    }
+
+
+def parse_payload(data):
+    """Separar um webhook (possivelmente com várias entradas) em mensagens recebidas e status de entrega"""
+    events, statuses = [], []
+    for entry in data.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            for message in value.get('messages', []):
+                events.append(whatsapp_event(message, value.get('contacts')))
+            for status in value.get('statuses', []):
+                statuses.append((status.get('id'), status.get('status')))
+        for messaging in entry.get('messaging', []):
+            if 'message' in messaging and not messaging['message'].get('is_echo'):
+                events.append(messenger_event(messaging))
+    return events, statuses
+
+
+def ingest(events):
+    """Gravar mensagens recebidas em lote, ignorando IDs já vistos.
+
+    Cada mensagem é ligada ao cliente pelo telefone normalizado. Retorna
+    (inseridas, duplicadas). A consulta prévia evita montar mensagens já
+    vistas; a garantia vem do índice único em ``external_id`` (ON CONFLICT DO
+    NOTHING no banco), que vale também quando a Meta reentrega o webhook a
+    outro worker enquanto o primeiro ainda processa.
+    """
+    with _ingest_lock:
+        events = [event for event in events if event['id']]
+        seen = WhatsAppMessage.existing_external_ids({event['id'] for event in events})
+        clients = {}
+        messages = []
+        for event in events:
+            if event['id'] in seen:
+                continue
+            seen.add(event['id'])
+            phone = event['phone']
+            if phone and phone not in clients:
+                clients[phone] = Client.get_by_phone(phone)
+            client = clients.get(phone) if phone else None
+            message = WhatsAppMessage(
+                sender=client.name if client else event['sender'],
+                message=event['text'],
+                message_type='received',
+                client_id=client.id if client else None,
+                recipient=None
+            )
+            message.external_id = event['id']
+            if event['timestamp']:
+                message.timestamp = datetime.fromtimestamp(event['timestamp'])
+            messages.append(message)
+        if messages:
+            messages = WhatsAppMessage.save_many(messages)
+        return len(messages), len(events) - len(messages)
+
+
+def apply_statuses(statuses):
+    """Avançar o status das mensagens enviadas; status fora de ordem não fazem regredir"""
+    updated = 0
+    for external_id, status in statuses:
+        new_status = DELIVERY_STATUSES.get(status)
+        if not external_id or not new_status:
+            continue
+        message = WhatsAppMessage.get_by_external_id(external_id)
+        if message is None:
+            continue
+        for current in ('sent', 'sending'):
+            if WhatsAppMessage.update_status(message.id, new_status, expect=current):
+                updated += 1
+                break
+    return updated
+
+
+def handle_payload(data):
+    """Processar um webhook já validado; retorna None se o corpo não for um objeto JSON"""
+    if not isinstance(data, dict):
+        return None
+    events, statuses = parse_payload(data)
+    received, duplicates = ingest(events)
+    return {'received': received, 'duplicates': duplicates, 'statuses': apply_statuses(statuses)}
@@ -0,0 +1,156 @@
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from models import WhatsAppMessage
+from services.meta_api import get_meta_api
+
+# Workers de envio por processo, tentativas por mensagem e backoff entre tentativas (segundos)
+SEND_WORKERS = int(os.environ.get('WHATSAPP_SEND_WORKERS', 8))
+SEND_MAX_ATTEMPTS = int(os.environ.get('WHATSAPP_SEND_MAX_ATTEMPTS', 5))
+SEND_RETRY_BASE = float(os.environ.get('WHATSAPP_SEND_RETRY_BASE', 5))
+SEND_RETRY_MAX = float(os.environ.get('WHATSAPP_SEND_RETRY_MAX', 300))
+# Tempo máximo de uma reserva (segundos): mensagens em 'sending' há mais tempo
+# pertenciam a um worker que morreu e voltam para a fila
+SEND_LEASE = float(os.environ.get('WHATSAPP_SEND_LEASE', 300))
+# De quanto em quanto tempo (segundos) cada processo procura reservas vencidas
+RECOVER_INTERVAL = float(os.environ.get('WHATSAPP_RECOVER_INTERVAL', 60))
+
+
+class OutboundQueue:
+    """Fila de envio de mensagens WhatsApp com workers em segundo plano.
+
+    A própria ``WhatsAppMessage`` (status ``queued``) é o registro durável da
+    fila: com ``DATABASE_URL`` ela sobrevive a reinícios e é recuperada por
+    ``resume_pending``. A fila em memória guarda apenas IDs. Antes de enviar, o
+    worker reserva a mensagem com compare-and-set (queued -> sending), então
+    vários processos gunicorn nunca enviam a mesma mensagem duas vezes. A
+    reserva guarda ``claimed_at``; reservas mais velhas que ``SEND_LEASE``
+    (worker reciclado no meio do envio) voltam para ``queued`` no boot e a
+    cada ``RECOVER_INTERVAL``, então o worker que substitui o reciclado
+    também as recupera quando a reserva vence.
+    """
+
+    def __init__(self, workers=SEND_WORKERS):
+        self.workers = workers
+        self.app = None
+        self.pending = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+        self.last_recover = 0.0
+
+    def init_app(self, app):
+        """Guardar a aplicação (contexto para os workers); não inicia nada"""
+        self.app = app
+
+    def resume_pending(self):
+        """Retomar as mensagens pendentes (uma vez por processo que atende requisições)"""
+        with self.app.app_context():
+            self.recover_stale()
+            pending = WhatsAppMessage.get_by_status('queued')
+        self.last_recover = time.monotonic()
+        for message in pending:
+            self.pending.put(message.id)
+        # Os workers também fazem a recuperação periódica, então sobem mesmo sem pendências
+        self.start()
+
+    def recover_stale(self, lease=SEND_LEASE):
+        """Devolver para a fila as mensagens com reserva vencida; retorna seus IDs"""
+        expired = datetime.now() - timedelta(seconds=lease)
+        recovered = []
+        for message in WhatsAppMessage.get_by_status('sending'):
+            if message.claimed_at is not None and message.claimed_at >= expired:
+                continue
+            # compare-and-set na própria reserva: outro processo pode ter recuperado antes
+            if WhatsAppMessage.store.update(message.id, expect={'status': 'sending', 'claimed_at': message.claimed_at},
+                                            status='queued', claimed_at=None) is not None:
+                recovered.append(message.id)
+        return recovered
+
+    def _recover_if_due(self):
+        """Recuperar reservas vencidas no máximo uma vez por ``RECOVER_INTERVAL`` neste processo"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_recover < RECOVER_INTERVAL:
+                return
+            self.last_recover = now
+        try:
+            with self._context():
+                recovered = self.recover_stale()
+        except Exception as e:
+            print(f"Erro ao recuperar mensagens WhatsApp presas: {e}")
+            return
+        for message_id in recovered:
+            self.pending.put(message_id)
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'whatsapp-sender-{number}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def enqueue(self, to_number, text, sender, client_id=None, campaign_id=None):
+        """Registrar a mensagem como ``queued`` e devolvê-la sem esperar o envio"""
+        message = WhatsAppMessage(
+            sender=sender,
+            message=text,
+            message_type='sent',
+            client_id=client_id,
+            recipient=to_number,
+            status='queued',
+            campaign_id=campaign_id
+        )
+        WhatsAppMessage.save(message)
+        self.pending.put(message.id)
+        self.start()
+        return message
+
+    def _run(self):
+        while True:
+            self._recover_if_due()
+            try:
+                message_id = self.pending.get(timeout=RECOVER_INTERVAL)
+            except queue.Empty:
+                continue
+            try:
+                with self._context():
+                    self.deliver(message_id)
+            except Exception as e:
+                print(f"Erro no worker de envio WhatsApp: {e}")
+            finally:
+                self.pending.task_done()
+
+    def deliver(self, message_id):
+        """Enviar uma mensagem reservada; falhas voltam para a fila com backoff"""
+        if not WhatsAppMessage.update_status(message_id, 'sending', expect='queued', claimed_at=datetime.now()):
+            return  # já reservada por outro worker/processo
+        message = WhatsAppMessage.store.get(message_id)
+        result = get_meta_api().send_whatsapp_message(message.recipient, message.message)
+        attempts = message.attempts + 1
+        if result:
+            external_id = (result.get('messages') or [{}])[0].get('id')
+            WhatsAppMessage.update_status(message_id, 'sent', attempts=attempts, external_id=external_id, error=None)
+        elif attempts < SEND_MAX_ATTEMPTS:
+            WhatsAppMessage.update_status(message_id, 'queued', attempts=attempts, error='Falha no envio; nova tentativa agendada')
+            delay = random.uniform(0, min(SEND_RETRY_MAX, SEND_RETRY_BASE * (2 ** attempts)))
+            timer = threading.Timer(delay, self.pending.put, (message_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            WhatsAppMessage.update_status(message_id, 'failed', attempts=attempts, error='Falha no envio após várias tentativas')
+
+    def join(self):
+        """Esperar a fila esvaziar (scripts e benchmarks)"""
+        self.pending.join()
+
+    def _context(self):
+        return self.app.app_context() if self.app is not None else nullcontext()
+
+
+outbound_queue = OutboundQueue()
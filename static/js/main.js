@@ -78,21 +78,41 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    // Search functionality enhancement
-    const searchInputs = document.querySelectorAll('input[type="search"], input[name*="search"]');
+    // Search typeahead (inputs with data-typeahead-url)
+    const searchInputs = document.querySelectorAll('input[data-typeahead-url]');
     searchInputs.forEach(input => {
-        let timeout;
-        input.addEventListener('input', function(e) {
-            clearTimeout(timeout);
-            timeout = setTimeout(() => {
-                // Add loading state
-                input.classList.add('loading');
-                // Remove loading state after 500ms (simulate search)
-                setTimeout(() => {
-                    input.classList.remove('loading');
-                }, 500);
-            }, 300);
+        let controller;
+        const list = document.createElement('div');
+        list.className = 'typeahead-results list-group shadow-sm d-none';
+        input.insertAdjacentElement('afterend', list);
+
+        const runSearch = debounce(function() {
+            const query = input.value.trim();
+            if (controller) controller.abort();
+            if (query.length < 2) {
+                renderTypeahead(list, input, []);
+                return;
+            }
+            controller = new AbortController();
+            input.classList.add('search-loading');
+            const url = `${input.dataset.typeaheadUrl}?q=${encodeURIComponent(query)}`;
+            fetch(url, { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => renderTypeahead(list, input, data.results || []))
+                .catch(error => {
+                    if (error.name !== 'AbortError') console.error('Erro na busca:', error);
+                })
+                .finally(() => input.classList.remove('search-loading'));
+        }, 300);
+
+        input.addEventListener('input', function() {
+            // Texto editado: a seleção anterior deixa de valer
+            if (input.dataset.typeaheadTarget) {
+                document.getElementById(input.dataset.typeaheadTarget).value = '';
+            }
+            runSearch();
         });
+        input.addEventListener('blur', () => setTimeout(() => list.classList.add('d-none'), 200));
     });
 
     // Table row click handlers
@@ -253,6 +273,39 @@ function updateKanbanCard(data) {
     }
 }
 
+function renderTypeahead(list, input, results) {
+    list.innerHTML = '';
+    results.forEach(client => {
+        const item = document.createElement('a');
+        item.className = 'list-group-item list-group-item-action';
+        if (input.dataset.typeaheadTarget) {
+            // Campo de formulário: a escolha preenche o ID do cliente em vez de navegar
+            item.href = '#';
+            item.addEventListener('click', function(e) {
+                e.preventDefault();
+                selectTypeahead(list, input, client);
+            });
+        } else {
+            item.href = `?search=${encodeURIComponent(client.name)}`;
+        }
+        const name = document.createElement('strong');
+        name.textContent = client.name;
+        const details = document.createElement('small');
+        details.className = 'd-block text-muted';
+        details.textContent = `${client.email} · ${client.phone} · ${client.cpf_cnpj}`;
+        item.append(name, details);
+        list.appendChild(item);
+    });
+    list.classList.toggle('d-none', results.length === 0);
+}
+
+function selectTypeahead(list, input, client) {
+    document.getElementById(input.dataset.typeaheadTarget).value = client.id;
+    input.value = client.name;
+    list.classList.add('d-none');
+    input.dispatchEvent(new CustomEvent('typeahead:select', { detail: client }));
+}
+
 function formatCurrency(value) {
     return new Intl.NumberFormat('pt-BR', {
         style: 'currency',
@@ -0,0 +1,184 @@
+"""Agendador da Graph API: limites de taxa, cabeçalhos de uso e novas tentativas."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from services import graph_scheduler
+from services.graph_scheduler import GraphScheduler, RateLimitExceeded, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeGraph(BaseHTTPRequestHandler):
+    """Graph API local: devolve as respostas de ``script`` em ordem, repetindo a última"""
+    protocol_version = 'HTTP/1.1'
+    script = [(200, {'id': '1'}, {})]
+    delay = 0.0
+
+    def do_GET(self):
+        self.reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.reply()
+
+    def reply(self):
+        with self.server.lock:
+            self.server.hits += 1
+            status, body, headers = self.script[min(self.server.hits, len(self.script)) - 1]
+        time.sleep(self.delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def graph():
+    """Sobe a Graph API falsa; ``graph(script, delay)`` retorna (url, servidor)"""
+    servers = []
+
+    def serve(script=None, delay=0.0):
+        handler = type('Handler', (FakeGraph,), {'script': script or FakeGraph.script, 'delay': delay})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.hits = 0
+        server.lock = threading.Lock()
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v18.0/me", server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def graph_error(code, status=400, headers=None):
+    return status, {'error': {'code': code, 'message': 'limite'}}, headers or {}
+
+
+def usage_headers(page=None, business=None, app=None):
+    headers = {}
+    if page is not None:
+        headers['X-Page-Usage'] = json.dumps(page)
+    if business is not None:
+        headers['X-Business-Use-Case-Usage'] = json.dumps(business)
+    if app is not None:
+        headers['X-App-Usage'] = json.dumps(app)
+    return headers
+
+
+def test_mixed_usage_headers_apply_the_highest_percent():
+    scheduler = GraphScheduler()
+    page = scheduler.bucket('page:1')
+    # Página quase no limite seguida de uma entrada de negócio folgada: vale a da página
+    scheduler.observe(FakeResponse(headers=usage_headers(
+        page={'call_count': 95, 'total_cputime': 20, 'total_time': 30},
+        business={'1': [{'type': 'pages', 'call_count': 10, 'total_cputime': 5, 'total_time': 5}]},
+    )), ['app', 'page:1'])
+    assert page.rate == page.base_rate * 0.1
+    # Na ordem inversa o resultado é o mesmo
+    scheduler.observe(FakeResponse(headers=usage_headers(
+        page={'call_count': 10},
+        business={'1': [{'call_count': 5}, {'call_count': 80, 'estimated_time_to_regain_access': 0}]},
+    )), ['app', 'page:1'])
+    assert page.rate == page.base_rate * 0.4
+
+
+def test_app_usage_and_unscoped_entries_share_the_app_bucket():
+    scheduler = GraphScheduler()
+    app = scheduler.buckets['app']
+    scheduler.observe(FakeResponse(headers=usage_headers(
+        app={'call_count': 90},
+        business={'1': [{'call_count': 0}]},
+    )), ['app'])
+    assert app.rate == app.base_rate * 0.2
+    scheduler.observe(FakeResponse(headers=usage_headers(app={'call_count': 10})), ['app'])
+    assert app.rate == app.base_rate
+
+
+def test_token_bucket_paces_requests_to_the_fake_server(graph):
+    url, server = graph()
+    scheduler = GraphScheduler()
+    scheduler.buckets['app'] = TokenBucket(20, 2)
+    start = time.monotonic()
+    with requests.Session() as session:
+        for _ in range(8):
+            assert scheduler.request(session, 'GET', url).status_code == 200
+    elapsed = time.monotonic() - start
+    # Duas fichas de rajada; as outras seis chegam a 20/s
+    assert server.hits == 8
+    assert 0.3 - 0.05 <= elapsed < 1.5
+
+
+@pytest.mark.parametrize('code', [4, 17, 32, 613])
+def test_throttle_errors_are_retried_even_for_posts(graph, monkeypatch, code):
+    monkeypatch.setattr(graph_scheduler, 'BACKOFF_BASE', 0.01)
+    url, server = graph([graph_error(code), graph_error(code), (200, {'id': '1'}, {})])
+    with requests.Session() as session:
+        response = GraphScheduler().request(session, 'POST', url, json={'message': 'oi'})
+    assert response.status_code == 200
+    assert server.hits == 3
+
+
+def test_errors_that_are_not_throttling_are_not_retried_for_posts(graph, monkeypatch):
+    monkeypatch.setattr(graph_scheduler, 'BACKOFF_BASE', 0.01)
+    url, server = graph([graph_error(2, status=500), (200, {'id': '1'}, {})])
+    with requests.Session() as session:
+        assert GraphScheduler().request(session, 'POST', url).status_code == 500
+    assert server.hits == 1
+
+
+def test_retry_after_beyond_the_deadline_returns_the_error(graph):
+    url, server = graph([graph_error(4, headers={'Retry-After': '5'})])
+    start = time.monotonic()
+    with requests.Session() as session:
+        response = GraphScheduler().request(session, 'GET', url, deadline=1)
+    assert response.json()['error']['code'] == 4
+    assert server.hits == 1
+    assert time.monotonic() - start < 1
+
+
+def test_slow_server_is_cut_off_at_the_deadline(graph, monkeypatch):
+    monkeypatch.setattr(graph_scheduler, 'BACKOFF_BASE', 0.01)
+    url, server = graph(delay=2)
+    start = time.monotonic()
+    with requests.Session() as session, pytest.raises(requests.Timeout):
+        GraphScheduler().request(session, 'GET', url, deadline=0.5)
+    # O timeout de cada tentativa é o que resta do prazo (mínimo de 0,1 s)
+    assert time.monotonic() - start < 0.5 + 0.1 * graph_scheduler.MAX_ATTEMPTS + 0.2
+
+
+def test_waiting_for_tokens_past_the_deadline_fails_fast(graph):
+    url, server = graph()
+    scheduler = GraphScheduler()
+    scheduler.buckets['app'] = TokenBucket(1, 1)
+    with requests.Session() as session:
+        scheduler.request(session, 'GET', url)
+        start = time.monotonic()
+        with pytest.raises(RateLimitExceeded):
+            scheduler.request(session, 'GET', url, deadline=0.3)
+    assert time.monotonic() - start < 0.1
+    assert server.hits == 1
+    # A ficha reservada é devolvida: a próxima chamada não herda a espera
+    assert scheduler.buckets['app'].tokens > -0.5
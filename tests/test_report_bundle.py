@@ -0,0 +1,46 @@
+"""Pacote ZIP de relatórios com o backend SQL (processos do pacote sem o mapeamento)."""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Em outro interpretador: o mapeamento do SQLAlchemy é global e deixaria os stores
+# em memória dos outros testes apontando para o banco
+PROBE = """
+import json, sys, zipfile
+from io import BytesIO
+from flask import Flask
+from database import init_database, create_schema
+from models import Client, KanbanCard
+from services import report_jobs
+from services.report_cache import report_cache
+
+
+class OfflineMetaAPI:
+    def get_unified_insights(self):
+        return {}
+
+
+app = Flask(__name__)
+init_database(app)
+create_schema(app)
+report_jobs.get_meta_api = OfflineMetaAPI
+report_cache.directory = sys.argv[1]
+with app.app_context():
+    for i in range(30):
+        Client.save(Client(f"Cliente {i}", f"cliente{i}@exemplo.com.br", '(11) 99999-0000', '', insurance_type='auto'))
+        KanbanCard.save(KanbanCard(f"Cartão {i}", '', None, 1))
+    output = report_jobs.build_bundle(BytesIO(), workers=2)
+print(json.dumps(zipfile.ZipFile(output).namelist()))
+"""
+
+
+def test_bundle_with_database_backend(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'crm.db'}", LOG_LEVEL='WARNING')
+    result = subprocess.run([sys.executable, '-c', PROBE, str(tmp_path / 'cache')], capture_output=True, text=True,
+                            env=env, timeout=120, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    names = json.loads(result.stdout.strip().splitlines()[-1])
+    assert sorted(name.rsplit('.', 1)[1] for name in names) == ['pdf', 'pdf', 'pdf', 'xlsx', 'xlsx']
@@ -0,0 +1,40 @@
+"""Custo de `import main` (boot de cada worker gunicorn)."""
+import json
+import os
+import subprocess
+import sys
+
+# Segundos para importar o app em um interpretador novo; hoje fica perto de 0,7 s
+IMPORT_BUDGET = 3.0
+# Carregados só quando usados: relatórios (reportlab/openpyxl) e chamadas à Graph API (requests)
+LAZY_MODULES = ('reportlab', 'openpyxl', 'requests')
+
+PROBE = f"""
+import json, sys, threading, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [name for name in {LAZY_MODULES!r} if name in sys.modules],
+                  'threads': [thread.name for thread in threading.enumerate()]}}))
+"""
+
+
+def import_main():
+    # Um processo novo por medição: no processo do pytest o app já pode estar importado
+    env = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+    env['LOG_LEVEL'] = 'WARNING'
+    result = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, env=env, timeout=60,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_stays_within_budget_and_skips_heavy_modules():
+    probe = import_main()
+    assert probe['loaded'] == []
+    assert probe['elapsed'] < IMPORT_BUDGET
+
+
+def test_import_main_starts_no_background_threads():
+    # Filas, campanhas, publicador e jobs só sobem em start_background_services (gunicorn.conf.py)
+    assert import_main()['threads'] == ['MainThread']
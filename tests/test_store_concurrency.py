@@ -0,0 +1,90 @@
+"""Escritas concorrentes no MemoryStore (workers gthread)."""
+import random
+import sys
+import threading
+
+import pytest
+
+from models import Client, KanbanCard, dashboard_metrics
+
+THREADS = 8
+SAVES_PER_THREAD = 2_000
+MOVES_PER_THREAD = 2_000
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    # Trocar de thread o tempo todo para expor corridas entre leitura e escrita
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_threads(target):
+    errors = []
+
+    def guarded(number):
+        try:
+            target(number)
+        except Exception as e:  # uma exceção em thread não derruba o teste sozinha
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(number,)) for number in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_concurrent_client_saves_get_unique_ids():
+    before = len(Client.store)
+    total_before = dashboard_metrics.snapshot()['total_clients']
+    saved = [[] for _ in range(THREADS)]
+
+    def save_clients(number):
+        for i in range(SAVES_PER_THREAD):
+            client = Client(f"Cliente {number}-{i}", f"c{number}-{i}@exemplo.com.br", '(11) 99999-0000', '')
+            Client.save(client)
+            saved[number].append(client)
+
+    run_threads(save_clients)
+
+    clients = [client for batch in saved for client in batch]
+    ids = [client.id for client in clients]
+    assert len(set(ids)) == THREADS * SAVES_PER_THREAD
+    assert len(Client.store) == before + THREADS * SAVES_PER_THREAD
+    assert all(Client.get(client.id) is client for client in clients)
+    assert dashboard_metrics.snapshot()['total_clients'] == total_before + THREADS * SAVES_PER_THREAD
+
+
+def test_ids_are_not_reused_after_delete():
+    first = Client.save(Client('Primeiro', 'a@exemplo.com.br', '', ''))
+    second = Client.save(Client('Segundo', 'b@exemplo.com.br', '', ''))
+    Client.delete(first.id)
+    third = Client.save(Client('Terceiro', 'c@exemplo.com.br', '', ''))
+    assert third.id > second.id
+    assert Client.get(second.id) is second
+
+
+def test_concurrent_card_moves_keep_columns_consistent():
+    cards = [KanbanCard.save(KanbanCard(f"Cartão {i}", '', None, None)) for i in range(50)]
+    before = KanbanCard.count_by_column()
+
+    def move_cards(number):
+        rng = random.Random(number)
+        for i in range(MOVES_PER_THREAD):
+            card = rng.choice(cards)
+            assert KanbanCard.move_to_column(card.id, rng.choice(KanbanCard.COLUMNS))
+            if i % 7 == 0:
+                KanbanCard.save(card)
+
+    run_threads(move_cards)
+
+    # Cada cartão aparece uma única vez, na coluna em que está
+    columns = {column: [card.id for card in KanbanCard.get_by_column(column)] for column in KanbanCard.COLUMNS}
+    for card in cards:
+        assert columns[card.column].count(card.id) == 1
+        assert sum(ids.count(card.id) for ids in columns.values()) == 1
+    assert sum(KanbanCard.count_by_column().values()) == sum(before.values())